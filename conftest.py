@@ -0,0 +1,51 @@
+"""
+Shared pytest fixtures for the test scripts.
+"""
+
+import pytest
+import download_311
+import download_violations
+import enrich_ais
+import enrich_spatial
+import enrich_violations
+import generate_report
+import query_service
+import refresh_daemon
+
+# Modules that open the database through their own `sqlite_db` setting
+database_modules = [
+    download_311,
+    download_violations,
+    enrich_ais,
+    enrich_spatial,
+    enrich_violations,
+    generate_report,
+    query_service,
+    refresh_daemon,
+]
+
+
+@pytest.fixture
+def temp_database(monkeypatch: pytest.MonkeyPatch, tmp_path) -> str:
+    """
+    Point the pipeline modules at an empty, initialized database in a temporary directory, for tests
+    that need a known set of rows. The report, run marker and parcel-centroid file are moved there
+    too, so a test never touches the real ones. monkeypatch restores everything afterwards.
+
+    Returns:
+        the path to the temporary database
+    """
+    path = str(tmp_path / "test.db")
+    for module in database_modules:
+        monkeypatch.setattr(module, "sqlite_db", path)
+    monkeypatch.setattr(generate_report, "report_file", str(tmp_path / "report.txt"))
+    monkeypatch.setattr(refresh_daemon, "run_marker_file", str(tmp_path / "pipeline_complete"))
+    monkeypatch.setattr(query_service, "run_marker_file", str(tmp_path / "pipeline_complete"))
+    monkeypatch.setattr(enrich_spatial, "parcel_centroids_file", str(tmp_path / "parcel_centroids.csv"))
+
+    download_311.init_database()
+    download_violations.init_database()
+    enrich_ais.init_ais_table()
+    enrich_spatial.init_spatial_table()
+    enrich_violations.init_violations_table()
+    return path
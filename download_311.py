@@ -11,25 +11,35 @@ sqlite_db = "data/311_service_requests.db"
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_311_service_requests(limit: int, offset: int) -> list[dict]:
+def get_311_service_requests(
+    limit: int,
+    offset: int,
+    start_date: str = "2025-01-01",
+    end_date: str = "2026-01-01",
+    session: requests.Session | None = None,
+) -> list[dict]:
     """
     Download 311 service requests from the City of Philadelphia's Carto database, in batches of `limit` records, starting from `offset`.
 
     Args:
         limit: int, the number of records to download in each batch
         offset: int, the offset of the records to download from the start of the dataset
+        start_date: str, the earliest requested_datetime to include, as YYYY-MM-DD
+        end_date: str, the exclusive upper requested_datetime bound, as YYYY-MM-DD
+        session: requests.Session, optional shared session for connection reuse
 
     Returns:
         list of dicts, the 311 service requests in the batch
     """
     
     query = f"""SELECT 
-    service_request_id, status, address, requested_datetime
+    service_request_id, status, address, requested_datetime, lat, lon
     FROM public_cases_fc
     WHERE
-     requested_datetime >= '2025-01-01'
-     AND requested_datetime < '2026-01-01'
+     requested_datetime >= '{start_date}'
+     AND requested_datetime < '{end_date}'
      AND agency_responsible = 'License ' || chr(38) || ' Inspections'
+    ORDER BY service_request_id
     LIMIT {limit}
     OFFSET {offset}
     """
@@ -37,13 +47,14 @@ def get_311_service_requests(limit: int, offset: int) -> list[dict]:
     logger.info(f"Downloading 311 service requests from {offset} to {offset + limit}")
     logger.debug(f"Query: {query}")
     url = f"https://phl.carto.com/api/v2/sql?q={query}"
-    response = requests.get(url)
+    response = (session or requests).get(url)
     return response.json()['rows']
 
 
 def init_database() -> None:
     """
-    Initialize the SQLite database. Create the table if it doesn't exist.
+    Initialize the SQLite database. Create the table if it doesn't exist, and add the
+    coordinate columns to tables created before they were downloaded.
 
     Args:
         None
@@ -53,25 +64,43 @@ def init_database() -> None:
     """
     with sqlite3.connect(sqlite_db) as conn:
         cursor = conn.cursor()
-        cursor.execute("CREATE TABLE IF NOT EXISTS public_cases_fc (service_request_id TEXT PRIMARY KEY, status TEXT, address TEXT, requested_datetime TEXT)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS public_cases_fc (service_request_id TEXT PRIMARY KEY, status TEXT, address TEXT, requested_datetime TEXT, lat REAL, lon REAL)")
+        cursor.execute("PRAGMA table_info(public_cases_fc)")
+        columns = [row[1] for row in cursor.fetchall()]
+        for column in ("lat", "lon"):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE public_cases_fc ADD COLUMN {column} REAL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_public_cases_address ON public_cases_fc(address)")
         conn.commit()
 
-def save_data(data: list[dict]) -> None:
+def save_data(data: list[dict], replace: bool = False, conn: sqlite3.Connection | None = None) -> None:
     """
     Save the data to the SQLite database.
 
     Args:
         data: list[dict], the data to save
+        replace: bool, whether to overwrite existing records (e.g. to pick up status changes) instead of
+            ignoring them. Existing records that have no coordinates yet get them either way, so a
+            database created before lat/lon were downloaded is backfilled by the next run.
+        conn: sqlite3.Connection, optional open connection to reuse (a new one is opened if not given)
     
     Returns:
         None
     """
     # convert the data to a list of tuples
-    data_tuples = [(row['service_request_id'], row['status'], row['address'], row['requested_datetime']) for row in data]
+    # lat/lon are null in Carto for some cases, so they are optional here
+    data_tuples = [(row['service_request_id'], row['status'], row['address'], row['requested_datetime'], row.get('lat'), row.get('lon')) for row in data]
 
-    with sqlite3.connect(sqlite_db) as conn:
+    with (conn or sqlite3.connect(sqlite_db)) as conn:
         cursor = conn.cursor()
-        cursor.executemany("INSERT OR IGNORE INTO public_cases_fc (service_request_id, status, address, requested_datetime) VALUES (?, ?, ?, ?)", data_tuples)
+        if replace:
+            cursor.executemany("INSERT OR REPLACE INTO public_cases_fc (service_request_id, status, address, requested_datetime, lat, lon) VALUES (?, ?, ?, ?, ?, ?)", data_tuples)
+        else:
+            cursor.executemany("""
+                INSERT INTO public_cases_fc (service_request_id, status, address, requested_datetime, lat, lon) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(service_request_id) DO UPDATE SET lat = excluded.lat, lon = excluded.lon
+                WHERE public_cases_fc.lat IS NULL
+            """, data_tuples)
         conn.commit()
 
 
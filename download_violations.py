@@ -1,32 +1,60 @@
 """
 Script to download code violations from the City of Philadelphia's Carto database, in batches.
+
+Two download modes are supported:
+- full: page through every violation citywide created since the start of 2025.
+- demand: after AIS enrichment, pull only the violations for OPA accounts that appear in
+  ais_addresses, from each account's earliest ticket date onward, using parallel chunked
+  `opa_account_num IN (...)` queries.
+
+Neither mode has an upper date bound, so violations filed after Dec 31 against late-2025 tickets are
+matched either way, and the choice of mode only changes how much data is moved, not the report.
+
+In auto mode a cost estimate picks whichever of the two moves less data.
 """
 
+import math
 import requests
 import logging
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 sqlite_db = "data/311_service_requests.db"
+carto_url = "https://phl.carto.com/api/v2/sql"
+full_start_date = "2025-01-01"
+
+# Rough cost of one Carto round trip, expressed in rows, so request count and row count can be compared.
+request_overhead_rows = 500
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def get_violations(limit: int, offset: int) -> list[dict]:
+def get_violations(
+    limit: int,
+    offset: int,
+    start_date: str = full_start_date,
+    end_date: str | None = None,
+    session: requests.Session | None = None,
+) -> list[dict]:
     """
     Download violations from the City of Philadelphia's Carto database, in batches.
 
     Args:
         limit: the number of records to download in each batch
         offset: the offset of the records to download from the start of the dataset
+        start_date: the earliest casecreateddate to include, as YYYY-MM-DD
+        end_date: the exclusive upper casecreateddate bound, as YYYY-MM-DD, or None for no bound
+        session: optional shared requests session for connection reuse
 
     Returns:
         list of dicts, the violations in the batch
     """
+    upper = f"AND casecreateddate < '{end_date}'" if end_date else ""
     query = f"""SELECT 
         cartodb_id, opa_account_num, casecreateddate
         FROM violations
-        WHERE casecreateddate >= '2025-01-01'
-        AND casecreateddate < '2026-01-01'
+        WHERE casecreateddate >= '{start_date}'
+        {upper}
         ORDER BY cartodb_id
         LIMIT {limit}
         OFFSET {offset}
@@ -34,12 +62,175 @@ def get_violations(limit: int, offset: int) -> list[dict]:
 
     logger.info(f"Downloading violations from {offset} to {offset + limit}")
     logger.debug(f"Query: {query}")
-    url = f"https://phl.carto.com/api/v2/sql?q={query}"
-    response = requests.get(url, timeout=60)
+    url = f"{carto_url}?q={query}"
+    response = (session or requests).get(url, timeout=60)
     response.raise_for_status()
     return response.json()['rows']
 
 
+def get_violations_for_opa(opa_account_nums: list[str], since: str, session: requests.Session, limit: int = 10000) -> list[dict]:
+    """
+    Download all violations for a chunk of OPA account numbers, created on or after `since`.
+    There is no upper date bound, so violations filed after the ticket year are still picked up.
+
+    Args:
+        opa_account_nums: the OPA account numbers to download violations for
+        since: the earliest casecreateddate to include, as YYYY-MM-DD
+        session: shared requests session for connection reuse
+        limit: the number of records to download per page within the chunk
+
+    Returns:
+        list of dicts, the violations for the chunk
+    """
+    in_list = ", ".join("'" + opa.replace("'", "''") + "'" for opa in opa_account_nums)
+    rows = []
+    offset = 0
+    while True:
+        query = f"""SELECT 
+            cartodb_id, opa_account_num, casecreateddate
+            FROM violations
+            WHERE opa_account_num IN ({in_list})
+            AND casecreateddate >= '{since}'
+            ORDER BY cartodb_id
+            LIMIT {limit}
+            OFFSET {offset}
+        """
+        logger.debug(f"Query: {query}")
+        response = session.get(carto_url, params={"q": query}, timeout=60)
+        response.raise_for_status()
+        page = response.json()['rows']
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        offset += limit
+
+
+def get_violation_stats(since: str, until: str | None = None) -> tuple[int, int]:
+    """
+    Count the violations in Carto created on or after `since` (and before `until`, if given),
+    along with the number of distinct OPA accounts they belong to.
+
+    Args:
+        since: the earliest casecreateddate to include, as YYYY-MM-DD
+        until: the exclusive upper casecreateddate bound, as YYYY-MM-DD, or None for no bound
+
+    Returns:
+        tuple of (row_count, distinct_opa_count)
+    """
+    upper = f"AND casecreateddate < '{until}'" if until else ""
+    query = f"""SELECT 
+        COUNT(*) AS row_count, COUNT(DISTINCT opa_account_num) AS opa_count
+        FROM violations
+        WHERE casecreateddate >= '{since}'
+        {upper}
+    """
+    logger.debug(f"Query: {query}")
+    response = requests.get(carto_url, params={"q": query}, timeout=60)
+    response.raise_for_status()
+    row = response.json()['rows'][0]
+    return row['row_count'], row['opa_count']
+
+
+def get_opa_demand() -> dict[str, str]:
+    """
+    Get the OPA account numbers resolved by AIS enrichment, with the earliest ticket date for each.
+
+    Returns:
+        a dictionary of OPA account numbers to the earliest requested date (YYYY-MM-DD) of their tickets,
+        empty if AIS enrichment hasn't run yet
+    """
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ais_addresses'")
+        if cursor.fetchone() is None:
+            return {}
+        cursor.execute("""
+            SELECT a.opa_account_num, MIN(p.requested_datetime)
+            FROM public_cases_fc p
+            INNER JOIN ais_addresses a ON p.address = a.address
+            WHERE a.opa_account_num IS NOT NULL
+              AND a.opa_account_num != ''
+            GROUP BY a.opa_account_num
+        """)
+        return {opa: earliest[:10] for opa, earliest in cursor.fetchall()}
+
+
+def chunk_demand(demand: dict[str, str], chunk_size: int) -> list[tuple[str, list[str]]]:
+    """
+    Split the OPA demand into chunks for `IN (...)` queries. Accounts are sorted by earliest
+    ticket date so each chunk's lower date bound (the earliest date in the chunk) stays tight.
+
+    Args:
+        demand: a dictionary of OPA account numbers to earliest ticket date
+        chunk_size: the maximum number of OPA account numbers per chunk
+
+    Returns:
+        list of (since, opa_account_nums) tuples
+    """
+    ordered = sorted(demand.items(), key=lambda item: (item[1], item[0]))
+    chunks = []
+    for start in range(0, len(ordered), chunk_size):
+        chunk = ordered[start:start + chunk_size]
+        chunks.append((chunk[0][1], [opa for opa, _ in chunk]))
+    return chunks
+
+
+def estimate_costs(
+    demand_count: int,
+    full_rows: int,
+    demand_window_rows: int,
+    demand_window_opas: int,
+    limit: int = 10000,
+    chunk_size: int = 200,
+) -> tuple[float, float]:
+    """
+    Estimate the cost of the full and demand-driven downloads, in rows plus a per-request overhead.
+
+    The demand-driven row count is estimated by assuming the resolved OPA accounts carry the
+    average number of violations per account in the demand date window.
+
+    Args:
+        demand_count: the number of OPA accounts to download violations for
+        full_rows: the number of violations the full download would page through
+        demand_window_rows: the number of violations in the demand date window
+        demand_window_opas: the number of distinct OPA accounts in the demand date window
+        limit: the page size of the full download
+        chunk_size: the number of OPA accounts per demand-driven query
+
+    Returns:
+        tuple of (full_cost, demand_cost)
+    """
+    full_requests = math.ceil(full_rows / limit) + 1
+    full_cost = full_rows + full_requests * request_overhead_rows
+
+    rows_per_opa = demand_window_rows / demand_window_opas if demand_window_opas > 0 else 0
+    demand_rows = min(demand_window_rows, demand_count * rows_per_opa)
+    demand_requests = math.ceil(demand_count / chunk_size)
+    demand_cost = demand_rows + demand_requests * request_overhead_rows
+    return full_cost, demand_cost
+
+
+def choose_mode(demand: dict[str, str], limit: int = 10000, chunk_size: int = 200) -> str:
+    """
+    Choose between the full and demand-driven download by comparing their estimated costs.
+
+    Args:
+        demand: a dictionary of OPA account numbers to earliest ticket date
+        limit: the page size of the full download
+        chunk_size: the number of OPA accounts per demand-driven query
+
+    Returns:
+        "full" or "demand"
+    """
+    if not demand:
+        return "full"
+    full_rows, _ = get_violation_stats(full_start_date)
+    window_rows, window_opas = get_violation_stats(min(demand.values()))
+    full_cost, demand_cost = estimate_costs(len(demand), full_rows, window_rows, window_opas, limit, chunk_size)
+    logger.info(f"Estimated cost: full={full_cost:,.0f}, demand={demand_cost:,.0f}")
+    return "demand" if demand_cost < full_cost else "full"
+
+
 def init_database() -> None:
     """
     Initialize the violations table in the SQLite database.
@@ -59,19 +250,20 @@ def init_database() -> None:
     logger.info("Violations table initialized")
 
 
-def save_data(data: list[dict]) -> None:
+def save_data(data: list[dict], conn: sqlite3.Connection | None = None) -> None:
     """
     Save the violations data to the SQLite database.
 
     Args:
         data: list of violation records
+        conn: optional open connection to reuse (a new one is opened if not given)
     """
     data_tuples = [
         (row['cartodb_id'], row['opa_account_num'], row['casecreateddate'])
         for row in data
     ]
 
-    with sqlite3.connect(sqlite_db) as conn:
+    with (conn or sqlite3.connect(sqlite_db)) as conn:
         cursor = conn.cursor()
         cursor.executemany(
             "INSERT OR IGNORE INTO violations (cartodb_id, opa_account_num, casecreateddate) VALUES (?, ?, ?)",
@@ -80,13 +272,17 @@ def save_data(data: list[dict]) -> None:
         conn.commit()
 
 
-def main() -> None:
+def download_full(limit: int = 10000) -> int:
     """
-    Main function to download the violations.
+    Download every violation citywide created since the start of 2025, page by page.
+
+    Args:
+        limit: the number of records to download in each batch
+
+    Returns:
+        the number of violations downloaded
     """
-    init_database()
     offset = 0
-    limit = 10000
     total = 0
 
     while True:
@@ -99,6 +295,62 @@ def main() -> None:
         logger.info(f"Downloaded {total} violations so far")
         offset += limit
 
+    return total
+
+
+def download_demand(demand: dict[str, str], chunk_size: int = 200, max_workers: int = 10) -> int:
+    """
+    Download violations only for the OPA accounts in `demand`, in parallel chunked queries.
+
+    Args:
+        demand: a dictionary of OPA account numbers to earliest ticket date
+        chunk_size: the number of OPA accounts per query
+        max_workers: number of parallel threads
+
+    Returns:
+        the number of violations downloaded
+    """
+    chunks = chunk_demand(demand, chunk_size)
+    logger.info(f"Downloading violations for {len(demand)} OPA accounts in {len(chunks)} chunks")
+    total = 0
+
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount("https://", adapter)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(get_violations_for_opa, opa_account_nums, since, session)
+                for since, opa_account_nums in chunks
+            ]
+            for future in as_completed(futures):
+                data = future.result()
+                save_data(data)
+                total += len(data)
+                logger.info(f"Downloaded {total} violations so far")
+
+    return total
+
+
+def main(mode: str = "auto") -> None:
+    """
+    Main function to download the violations.
+
+    Args:
+        mode: "full", "demand", or "auto" to pick by estimated cost. Demand mode needs
+            ais_addresses to be populated, so it must run after AIS enrichment.
+    """
+    init_database()
+    demand = get_opa_demand() if mode != "full" else {}
+    if mode == "auto":
+        mode = choose_mode(demand)
+    logger.info(f"Downloading violations in {mode} mode")
+
+    if mode == "demand":
+        total = download_demand(demand)
+    else:
+        total = download_full()
+
     logger.info(f"Violations download complete. Total: {total} records.")
 
 
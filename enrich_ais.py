@@ -1,22 +1,45 @@
 """
 Script to enrich 311 service request addresses with OPA account numbers from the Philadelphia AIS API.
+
+The full AIS response for every address is kept, zlib-compressed, in the ais_responses table, so the
+OPA account numbers can be re-derived offline (`python enrich_ais.py --rederive`) after a change to
+extract_opa_account_num, without querying AIS again.
+
+Several processes, on one or more hosts, can enrich at once by running this script against the same
+database. Workers claim ranges of addresses through the ais_work_ranges lease table; a range whose
+lease expires (because its worker crashed or stalled) is reclaimed by the next worker to look.
 """
 
+import json
+import os
 import requests
 import logging
+import socket
 import sqlite3
+import sys
+import time
+import zlib
 from typing import Generator
 from urllib.parse import quote
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from fuzzy_match import TrigramIndex
+from hedging import Hedger
 
 sqlite_db = "data/311_service_requests.db"
+# Other workers may hold the write lock, so wait for it rather than failing
+sqlite_timeout = 60
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 def init_ais_table() -> None:
     """
-    Initialize the AIS enrichment table. Create the table if it doesn't exist.
+    Initialize the AIS enrichment table. Create the table if it doesn't exist, and add the
+    match_score, source and matched_address columns to tables created before they existed.
+
+    The source column records where each OPA account number came from: 'ais' for the AIS API,
+    'fuzzy' for a fuzzy match, and 'spatial' for the nearest-parcel fallback. For fuzzy matches,
+    matched_address is the AIS-resolved address the OPA account number was copied from.
     """
     with sqlite3.connect(sqlite_db) as conn:
         cursor = conn.cursor()
@@ -24,17 +47,52 @@ def init_ais_table() -> None:
             CREATE TABLE IF NOT EXISTS ais_addresses (
                 address TEXT PRIMARY KEY,
                 opa_account_num TEXT,
+                match_score REAL,
+                source TEXT,
+                matched_address TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        cursor.execute("PRAGMA table_info(ais_addresses)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if "match_score" not in columns:
+            cursor.execute("ALTER TABLE ais_addresses ADD COLUMN match_score REAL")
+        if "source" not in columns:
+            cursor.execute("ALTER TABLE ais_addresses ADD COLUMN source TEXT")
+            cursor.execute("UPDATE ais_addresses SET source = CASE WHEN match_score IS NULL THEN 'ais' ELSE 'fuzzy' END")
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='spatial_matches'")
+            if cursor.fetchone() is not None:
+                cursor.execute("UPDATE ais_addresses SET source = 'spatial' WHERE address IN (SELECT address FROM spatial_matches)")
+        if "matched_address" not in columns:
+            cursor.execute("ALTER TABLE ais_addresses ADD COLUMN matched_address TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ais_addresses_opa ON ais_addresses(opa_account_num)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ais_responses (
+                address TEXT PRIMARY KEY,
+                payload BLOB,
+                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ais_work_ranges (
+                range_id INTEGER PRIMARY KEY,
+                start_address TEXT,
+                end_address TEXT,
+                status TEXT DEFAULT 'pending',
+                worker_id TEXT,
+                lease_expires_at REAL
+            )
+        """)
         conn.commit()
     logger.info("AIS addresses table initialized")
 
 
 def get_unique_addresses(batch_size: int = 1000) -> Generator[str, None, None]:
     """
-    Yield unique addresses from the public_cases_fc table that haven't been enriched yet.
+    Yield unique addresses from the public_cases_fc table that haven't been enriched yet, in order.
+    Each batch starts after the last address of the previous one, so an address that is still
+    unresolved when the next batch is fetched is not yielded again.
 
     Args:
         batch_size: number of addresses to fetch per batch from the database.
@@ -42,6 +100,7 @@ def get_unique_addresses(batch_size: int = 1000) -> Generator[str, None, None]:
     Yields:
         unique address strings
     """
+    last_address = ""
     while True:
         with sqlite3.connect(sqlite_db) as conn:
             cursor = conn.cursor()
@@ -49,43 +108,229 @@ def get_unique_addresses(batch_size: int = 1000) -> Generator[str, None, None]:
                 SELECT DISTINCT p.address 
                 FROM public_cases_fc p
                 LEFT JOIN ais_addresses a ON p.address = a.address
-                WHERE a.address IS NULL AND p.address IS NOT NULL
+                WHERE a.address IS NULL AND p.address IS NOT NULL AND p.address > ?
+                ORDER BY p.address
                 LIMIT ?
-            """, (batch_size,))
+            """, (last_address, batch_size))
             results = cursor.fetchall()
         if not results:
             break
         for row in results:
             yield row[0]
+        last_address = results[-1][0]
 
-def lookup_ais(address: str, session: requests.Session) -> tuple[str, str]:
+def fetch_ais(address: str, session: requests.Session) -> dict:
     """
-    Look up an address in the Philadelphia AIS API and return the OPA account number.
+    Query the Philadelphia AIS API for an address and return the full response.
 
     Args:
         address: the address to look up
         session: shared requests session for connection reuse
 
     Returns:
-        tuple of (address, opa_account_num) - empty string if not found
+        the decoded JSON response
     """
     encoded_address = quote(address)
     url = f"https://api.phila.gov/ais/v2/search/{encoded_address}"
 
     response = session.get(url, timeout=10)
     response.raise_for_status()
-    data = response.json()
-    
+    return response.json()
+
+
+def extract_opa_account_num(data: dict) -> str:
+    """
+    Choose the OPA account number from an AIS response. This is the only place that decides
+    between candidate features, so changing it and re-deriving needs no API calls.
+
+    Args:
+        data: the decoded AIS response
+
+    Returns:
+        the OPA account number of the first candidate feature, or an empty string if there is none
+    """
     if 'features' in data and len(data['features']) > 0:
         properties = data['features'][0].get('properties', {})
-        opa_account_num = properties.get('opa_account_num', '')
-        logger.debug(f"Found OPA account {opa_account_num} for {address}")
-        return address, opa_account_num
-    else:
-        return address, ""
+        return properties.get('opa_account_num', '') or ''
+    return ""
+
+
+def plan_work_ranges(cursor: sqlite3.Cursor, range_size: int) -> int:
+    """
+    Split the addresses that haven't been enriched yet into contiguous, sorted ranges of about
+    `range_size` addresses, replacing any completed ranges. Must be called inside a write transaction.
+
+    Args:
+        cursor: a cursor on a connection holding the write lock
+        range_size: the number of addresses per range
+
+    Returns:
+        the number of ranges created
+    """
+    cursor.execute("""
+        SELECT DISTINCT p.address
+        FROM public_cases_fc p
+        LEFT JOIN ais_addresses a ON p.address = a.address
+        WHERE a.address IS NULL AND p.address IS NOT NULL
+        ORDER BY p.address
+    """)
+    addresses = [row[0] for row in cursor.fetchall()]
+    ranges = [
+        (addresses[start], addresses[min(start + range_size, len(addresses)) - 1])
+        for start in range(0, len(addresses), range_size)
+    ]
+    cursor.execute("DELETE FROM ais_work_ranges WHERE status = 'done'")
+    cursor.executemany("INSERT INTO ais_work_ranges (start_address, end_address) VALUES (?, ?)", ranges)
+    return len(ranges)
+
+
+def claim_work_range(worker_id: str, lease_seconds: float, range_size: int = 3000) -> tuple[int, str, str] | None:
+    """
+    Claim a pending address range whose lease is free or expired, planning new ranges first if
+    there are no pending ones left.
+
+    Args:
+        worker_id: the identifier of the claiming worker
+        lease_seconds: how long the lease lasts before another worker may reclaim the range
+        range_size: the number of addresses per range, if new ranges are planned
+
+    Returns:
+        tuple of (range_id, start_address, end_address), or None if no range is available right now
+    """
+    conn = sqlite3.connect(sqlite_db, timeout=sqlite_timeout, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT COUNT(*) FROM ais_work_ranges WHERE status = 'pending'")
+        if cursor.fetchone()[0] == 0:
+            planned = plan_work_ranges(cursor, range_size)
+            logger.info(f"Planned {planned} address ranges")
+
+        now = time.time()
+        cursor.execute("""
+            SELECT range_id, start_address, end_address, worker_id FROM ais_work_ranges
+            WHERE status = 'pending' AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+            ORDER BY range_id
+            LIMIT 1
+        """, (now,))
+        row = cursor.fetchone()
+        if row is not None:
+            range_id, start_address, end_address, previous_worker = row
+            if previous_worker is not None:
+                logger.warning(f"Reclaiming range {range_id} from expired lease held by {previous_worker}")
+            cursor.execute(
+                "UPDATE ais_work_ranges SET worker_id = ?, lease_expires_at = ? WHERE range_id = ?",
+                (worker_id, now + lease_seconds, range_id)
+            )
+        cursor.execute("COMMIT")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+    return range_id, start_address, end_address
+
+
+def renew_lease(range_id: int, worker_id: str, lease_seconds: float) -> bool:
+    """
+    Extend the lease on a range, if the worker still holds it.
+
+    Args:
+        range_id: the range
+        worker_id: the identifier of the worker
+        lease_seconds: how long from now the lease should last
+
+    Returns:
+        True if the lease was renewed, False if another worker has reclaimed the range
+    """
+    with sqlite3.connect(sqlite_db, timeout=sqlite_timeout) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE ais_work_ranges SET lease_expires_at = ? WHERE range_id = ? AND worker_id = ? AND status = 'pending'",
+            (time.time() + lease_seconds, range_id, worker_id)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+
+
+def complete_work_range(range_id: int, worker_id: str) -> None:
+    """
+    Mark a range as done, if the worker still holds it.
+
+    Args:
+        range_id: the range
+        worker_id: the identifier of the worker
+    """
+    with sqlite3.connect(sqlite_db, timeout=sqlite_timeout) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE ais_work_ranges SET status = 'done', lease_expires_at = NULL WHERE range_id = ? AND worker_id = ?",
+            (range_id, worker_id)
+        )
+        conn.commit()
+
+
+def count_pending_ranges() -> int:
+    """
+    Count the ranges that haven't been completed, including ones leased to other workers.
+
+    Returns:
+        the number of pending ranges
+    """
+    with sqlite3.connect(sqlite_db, timeout=sqlite_timeout) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM ais_work_ranges WHERE status = 'pending'")
+        return cursor.fetchone()[0]
+
+
+def get_range_addresses(start_address: str, end_address: str) -> list[str]:
+    """
+    Get the addresses in a range that haven't been enriched yet.
+
+    Args:
+        start_address: the first address of the range, inclusive
+        end_address: the last address of the range, inclusive
+
+    Returns:
+        the addresses, sorted
+    """
+    with sqlite3.connect(sqlite_db, timeout=sqlite_timeout) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT p.address
+            FROM public_cases_fc p
+            LEFT JOIN ais_addresses a ON p.address = a.address
+            WHERE a.address IS NULL AND p.address >= ? AND p.address <= ?
+            ORDER BY p.address
+        """, (start_address, end_address))
+        return [row[0] for row in cursor.fetchall()]
+
 
+def lookup_ais(address: str, session: requests.Session) -> tuple[str, str]:
+    """
+    Look up an address in the Philadelphia AIS API and return the OPA account number.
 
-def lookup_ais_batch(addresses: list[str], session: requests.Session, max_workers: int = 10) -> dict[str, str]:
+    Args:
+        address: the address to look up
+        session: shared requests session for connection reuse
+
+    Returns:
+        tuple of (address, opa_account_num) - empty string if not found
+    """
+    opa_account_num = extract_opa_account_num(fetch_ais(address, session))
+    logger.debug(f"Found OPA account {opa_account_num!r} for {address}")
+    return address, opa_account_num
+
+
+def lookup_ais_batch(
+    addresses: list[str],
+    session: requests.Session,
+    max_workers: int = 10,
+    hedger: Hedger | None = None,
+) -> dict[str, dict | None]:
     """
     Look up a batch of addresses in parallel using a shared session.
 
@@ -93,84 +338,296 @@ def lookup_ais_batch(addresses: list[str], session: requests.Session, max_worker
         addresses: the addresses to look up
         session: shared requests session for connection reuse
         max_workers: number of parallel threads
+        hedger: if given, slow lookups are hedged with a duplicate request
 
     Returns:
-        a dictionary of addresses to OPA account numbers
+        a dictionary of addresses to AIS responses - None if the lookup failed
     """
     results = {}
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_address = {
-            executor.submit(lookup_ais, addr, session): addr
-            for addr in addresses
-        }
+        future_to_address = {}
+        for addr in addresses:
+            if hedger:
+                future = executor.submit(hedger.call, fetch_ais, addr, session)
+            else:
+                future = executor.submit(fetch_ais, addr, session)
+            future_to_address[future] = addr
         
         for future in as_completed(future_to_address):
             address = future_to_address[future]
             try:
-                addr, opa = future.result()
-                results[addr] = opa
+                results[address] = future.result()
             except Exception as e:
                 logger.warning(f"Error looking up {address}: {e}")
-                results[address] = ""
+                results[address] = None
     
     return results
 
 
-def save_ais_data(address: str, opa_account_num: str) -> None:
+def save_ais_data(
+    address: str,
+    opa_account_num: str,
+    match_score: float | None = None,
+    matched_address: str | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
     """
     Save the AIS data to the database. If the address already exists, replace the OPA account number.
+    The source is 'fuzzy' if a match score is given, and 'ais' otherwise.
 
     Args:
         address: the address
         opa_account_num: the OPA account number
+        match_score: the fuzzy match similarity, or None if the OPA account number came from the AIS API
+        matched_address: for a fuzzy match, the indexed address it matched
+        conn: optional open connection to reuse (a new one is opened if not given)
     """
-    with sqlite3.connect(sqlite_db) as conn:
+    with (conn or sqlite3.connect(sqlite_db, timeout=sqlite_timeout)) as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT OR REPLACE INTO ais_addresses (address, opa_account_num, created_at, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
-            (address, opa_account_num)
+            "INSERT OR REPLACE INTO ais_addresses (address, opa_account_num, match_score, source, matched_address, created_at, updated_at) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+            (address, opa_account_num, match_score, "ais" if match_score is None else "fuzzy", matched_address)
         )
         conn.commit()
 
 
-def main() -> None:
+def save_ais_response(address: str, data: dict, conn: sqlite3.Connection | None = None) -> None:
+    """
+    Save the full AIS response for an address, as zlib-compressed JSON.
+
+    Args:
+        address: the address
+        data: the decoded AIS response
+        conn: optional open connection to reuse (a new one is opened if not given)
+    """
+    payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+    with (conn or sqlite3.connect(sqlite_db, timeout=sqlite_timeout)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO ais_responses (address, payload, fetched_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+            (address, payload)
+        )
+        conn.commit()
+
+
+def rederive_ais_addresses(batch_size: int = 5000) -> int:
+    """
+    Re-derive the OPA account numbers of every address whose value came from a stored AIS response,
+    using extract_opa_account_num, then copy them to the fuzzy matches of those addresses. Addresses
+    filled in by the spatial fallback are left alone. Makes no API calls.
+
+    Args:
+        batch_size: number of responses to decompress and update per transaction
+
+    Returns:
+        the number of addresses whose OPA account number changed
+    """
+    changed = 0
+    with sqlite3.connect(sqlite_db) as conn:
+        read_cursor = conn.cursor()
+        write_cursor = conn.cursor()
+        read_cursor.execute("""
+            SELECT r.address, r.payload, a.opa_account_num
+            FROM ais_responses r
+            INNER JOIN ais_addresses a ON r.address = a.address
+            WHERE a.source = 'ais'
+        """)
+        while True:
+            rows = read_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            updates = []
+            for address, payload, current in rows:
+                opa_account_num = extract_opa_account_num(json.loads(zlib.decompress(payload)))
+                if opa_account_num != current:
+                    updates.append((opa_account_num, address))
+            write_cursor.executemany(
+                "UPDATE ais_addresses SET opa_account_num = ?, updated_at = CURRENT_TIMESTAMP WHERE address = ?",
+                updates
+            )
+            changed += len(updates)
+
+        # fuzzy matches follow the address they were matched to
+        write_cursor.execute("""
+            UPDATE ais_addresses
+            SET opa_account_num = (SELECT s.opa_account_num FROM ais_addresses s WHERE s.address = ais_addresses.matched_address),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE source = 'fuzzy'
+              AND matched_address IN (SELECT address FROM ais_addresses WHERE source = 'ais')
+              AND opa_account_num IS NOT (SELECT s.opa_account_num FROM ais_addresses s WHERE s.address = ais_addresses.matched_address)
+        """)
+        changed += write_cursor.rowcount
+        conn.commit()
+    logger.info(f"Re-derived AIS results, {changed} OPA account numbers changed")
+    return changed
+
+
+def build_fuzzy_index(threshold: float = 0.85) -> TrigramIndex:
+    """
+    Build a trigram index over the addresses the AIS API has already resolved to an OPA account number.
+    Fuzzy and spatial matches are left out, so new addresses are only ever matched to AIS answers.
+
+    Args:
+        threshold: the minimum similarity for a fuzzy match
+
+    Returns:
+        the trigram index
     """
-    Main function to enrich addresses with OPA account numbers.
+    index = TrigramIndex(threshold)
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT address, opa_account_num FROM ais_addresses
+            WHERE opa_account_num IS NOT NULL AND opa_account_num != '' AND source = 'ais'
+        """)
+        for address, opa_account_num in cursor.fetchall():
+            index.add(address, opa_account_num)
+    logger.info(f"Built fuzzy match index over {len(index)} resolved addresses")
+    return index
+
+
+def resolve_batch(
+    addresses: list[str],
+    session: requests.Session,
+    index: TrigramIndex,
+    max_workers: int = 10,
+    hedger: Hedger | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    """
+    Resolve a batch of addresses: first against the fuzzy match index, then the rest with the AIS API.
+    Addresses the AIS API resolves are added to the index.
+
+    Args:
+        addresses: the addresses to resolve
+        session: shared requests session for connection reuse
+        index: the fuzzy match index of already-resolved addresses
+        max_workers: number of parallel threads for the AIS API
+        hedger: if given, slow AIS lookups are hedged with a duplicate request
+        conn: optional open connection to save the results with
+
+    Returns:
+        the number of addresses resolved by the fuzzy match index
+    """
+    remaining = []
+    for address in addresses:
+        match = index.lookup(address)
+        if match is None:
+            remaining.append(address)
+            continue
+        opa, score, matched_address = match
+        logger.debug(f"Fuzzy matched {address} to {matched_address}, OPA account {opa} (score {score:.2f})")
+        save_ais_data(address, opa, score, matched_address, conn=conn)
+
+    results = lookup_ais_batch(remaining, session, max_workers=max_workers, hedger=hedger) if remaining else {}
+    for addr, data in results.items():
+        if data is None:
+            save_ais_data(addr, "", conn=conn)
+            continue
+        save_ais_response(addr, data, conn=conn)
+        opa = extract_opa_account_num(data)
+        save_ais_data(addr, opa, conn=conn)
+        if opa:
+            index.add(addr, opa)
+    return len(addresses) - len(remaining)
+
+
+def process_work_range(
+    range_id: int,
+    start_address: str,
+    end_address: str,
+    worker_id: str,
+    lease_seconds: float,
+    session: requests.Session,
+    index: TrigramIndex,
+    hedger: Hedger | None = None,
+    batch_size: int = 300,
+) -> tuple[int, int]:
+    """
+    Enrich the addresses in a claimed range, renewing the lease before each batch. Stops early if
+    the lease has been lost to another worker.
+
+    Args:
+        range_id: the claimed range
+        start_address: the first address of the range, inclusive
+        end_address: the last address of the range, inclusive
+        worker_id: the identifier of this worker
+        lease_seconds: how long each lease renewal lasts
+        session: shared requests session for connection reuse
+        index: the fuzzy match index of already-resolved addresses
+        hedger: if given, slow AIS lookups are hedged with a duplicate request
+        batch_size: the number of addresses to resolve between lease renewals
+
+    Returns:
+        tuple of (addresses processed, addresses resolved by fuzzy match)
+    """
+    addresses = get_range_addresses(start_address, end_address)
+    total = 0
+    fuzzy_total = 0
+    for start in range(0, len(addresses), batch_size):
+        if not renew_lease(range_id, worker_id, lease_seconds):
+            logger.warning(f"Lost lease on range {range_id}, leaving it to the worker that reclaimed it")
+            return total, fuzzy_total
+        batch = addresses[start:start + batch_size]
+        fuzzy_total += resolve_batch(batch, session, index, max_workers=300, hedger=hedger)
+        total += len(batch)
+    complete_work_range(range_id, worker_id)
+    return total, fuzzy_total
+
+
+def main(lease_seconds: float = 300, poll_seconds: float = 10, hedge: bool = False) -> None:
+    """
+    Main function to enrich addresses with OPA account numbers. Claims and enriches address ranges
+    until none are pending; while other workers hold the remaining leases, waits in case they expire.
+
+    Args:
+        lease_seconds: how long a range lease lasts without renewal
+        poll_seconds: how long to wait between claims while other workers hold every pending range
+        hedge: whether to hedge AIS lookups slower than the observed p95 latency with a duplicate request
     """
     init_ais_table()
-    
-    batch_size = 300
-    batch = []
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
     total = 0
+    fuzzy_total = 0
+    index = build_fuzzy_index()
+    # Primary and duplicate requests each need a thread and a connection
+    hedger = Hedger(max_workers=600) if hedge else None
+    pool_size = 600 if hedge else 300
 
-    
-    
     with requests.Session() as session:
 
         # Configure connection pool to match max_workers
-        adapter = requests.adapters.HTTPAdapter(pool_connections=300, pool_maxsize=300)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
         session.mount("https://", adapter)
 
-        for address in get_unique_addresses():
-            batch.append(address)
-            if len(batch) >= batch_size:
-                results = lookup_ais_batch(batch, session, max_workers=300)
-                for addr, opa in results.items():
-                    save_ais_data(addr, opa)
-                total += len(batch)
-                logger.info(f"Processed {total} addresses")
-                batch = []
-        
-        # Handle remaining addresses
-        if batch:
-            results = lookup_ais_batch(batch, session, max_workers=300)
-            for addr, opa in results.items():
-                save_ais_data(addr, opa)
-            total += len(batch)
+        while True:
+            claimed = claim_work_range(worker_id, lease_seconds)
+            if claimed is None:
+                if count_pending_ranges() == 0:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            range_id, start_address, end_address = claimed
+            logger.info(f"Worker {worker_id} claimed range {range_id} ({start_address} to {end_address})")
+            processed, fuzzy = process_work_range(
+                range_id, start_address, end_address, worker_id, lease_seconds, session, index, hedger
+            )
+            total += processed
+            fuzzy_total += fuzzy
+            logger.info(f"Processed {total} addresses")
+
+    if hedger:
+        hedger.shutdown()
+        logger.info(f"Hedging metrics: {hedger.metrics()}")
     
-    logger.info(f"Enrichment complete. Processed {total} addresses.")
+    logger.info(f"Enrichment complete. Processed {total} addresses, {fuzzy_total} by fuzzy match.")
 
 
 if __name__ == "__main__":
-    main()
+    if '--rederive' in sys.argv:
+        init_ais_table()
+        rederive_ais_addresses()
+    else:
+        main(hedge='--hedge' in sys.argv)
@@ -0,0 +1,233 @@
+"""
+Script to resolve addresses that AIS couldn't match to an OPA account, by assigning the nearest
+parcel centroid to the 311 case coordinates. Runs fully offline against a local parcel-centroid file.
+
+The parcel-centroid file is a CSV with `opa_account_num`, `lat` and `lon` columns, for example an
+export of the OPA properties dataset.
+"""
+
+import csv
+import logging
+import math
+import os
+import sqlite3
+
+sqlite_db = "data/311_service_requests.db"
+parcel_centroids_file = "data/parcel_centroids.csv"
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Philadelphia is small enough that an equirectangular projection around its latitude is accurate
+# to well under a metre at the distances we care about.
+reference_lat = 39.95
+meters_per_degree_lat = 111320.0
+meters_per_degree_lon = meters_per_degree_lat * math.cos(math.radians(reference_lat))
+
+
+def project(lat: float, lon: float) -> tuple[float, float]:
+    """
+    Project a latitude/longitude pair onto a local planar grid, in metres.
+
+    Args:
+        lat: the latitude
+        lon: the longitude
+
+    Returns:
+        tuple of (x, y) in metres
+    """
+    return lon * meters_per_degree_lon, lat * meters_per_degree_lat
+
+
+class ParcelGridIndex:
+    """
+    A uniform grid index over parcel centroids, for nearest-parcel lookups within a distance threshold.
+    The cell size equals the threshold, so any match lies in the query's cell or one of its 8 neighbours.
+    """
+
+    def __init__(self, parcels: list[tuple[str, float, float]], max_distance_m: float) -> None:
+        """
+        Build the index.
+
+        Args:
+            parcels: list of (opa_account_num, lat, lon) tuples
+            max_distance_m: the maximum distance, in metres, of a match
+        """
+        self.max_distance_m = max_distance_m
+        self.cells: dict[tuple[int, int], list[tuple[str, float, float]]] = {}
+        for opa_account_num, lat, lon in parcels:
+            x, y = project(lat, lon)
+            self.cells.setdefault(self._cell(x, y), []).append((opa_account_num, x, y))
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return int(math.floor(x / self.max_distance_m)), int(math.floor(y / self.max_distance_m))
+
+    def nearest(self, lat: float, lon: float) -> tuple[str, float] | None:
+        """
+        Find the nearest parcel to a point, within the distance threshold.
+
+        Args:
+            lat: the latitude of the point
+            lon: the longitude of the point
+
+        Returns:
+            tuple of (opa_account_num, distance in metres), or None if no parcel is close enough
+        """
+        x, y = project(lat, lon)
+        cx, cy = self._cell(x, y)
+        best = None
+        best_distance_sq = self.max_distance_m ** 2
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for opa_account_num, px, py in self.cells.get((cx + dx, cy + dy), ()):
+                    distance_sq = (px - x) ** 2 + (py - y) ** 2
+                    if distance_sq <= best_distance_sq:
+                        best = opa_account_num
+                        best_distance_sq = distance_sq
+        if best is None:
+            return None
+        return best, math.sqrt(best_distance_sq)
+
+
+def load_parcel_centroids(path: str = parcel_centroids_file) -> list[tuple[str, float, float]]:
+    """
+    Load parcel centroids from a CSV file, skipping rows without an OPA account or coordinates.
+
+    Args:
+        path: the path to the parcel-centroid CSV file
+
+    Returns:
+        list of (opa_account_num, lat, lon) tuples
+    """
+    parcels = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if not row.get("opa_account_num") or not row.get("lat") or not row.get("lon"):
+                continue
+            parcels.append((row["opa_account_num"], float(row["lat"]), float(row["lon"])))
+    logger.info(f"Loaded {len(parcels)} parcel centroids from {path}")
+    return parcels
+
+
+def init_spatial_table() -> None:
+    """
+    Initialize the spatial matches table. Create the table if it doesn't exist.
+    """
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS spatial_matches (
+                address TEXT PRIMARY KEY,
+                opa_account_num TEXT,
+                distance_m REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+    logger.info("Spatial matches table initialized")
+
+
+def get_unresolved_points() -> list[tuple[str, float, float]]:
+    """
+    Get the addresses AIS couldn't resolve, with the average coordinates of their 311 cases.
+
+    Returns:
+        list of (address, lat, lon) tuples
+    """
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT a.address, AVG(p.lat), AVG(p.lon)
+            FROM ais_addresses a
+            INNER JOIN public_cases_fc p ON p.address = a.address
+            WHERE (a.opa_account_num IS NULL OR a.opa_account_num = '')
+              AND p.lat IS NOT NULL
+              AND p.lon IS NOT NULL
+            GROUP BY a.address
+        """)
+        return cursor.fetchall()
+
+
+def count_unresolved_addresses() -> int:
+    """
+    Count the addresses AIS couldn't resolve, with or without coordinates.
+
+    Returns:
+        the number of unresolved addresses
+    """
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM ais_addresses WHERE opa_account_num IS NULL OR opa_account_num = ''")
+        return cursor.fetchone()[0]
+
+
+def resolve_points(points: list[tuple[str, float, float]], index: ParcelGridIndex) -> list[tuple[str, str, float]]:
+    """
+    Resolve a list of points to their nearest parcels.
+
+    Args:
+        points: list of (address, lat, lon) tuples
+        index: the parcel index to search
+
+    Returns:
+        list of (address, opa_account_num, distance_m) tuples, for the points that matched
+    """
+    matches = []
+    for address, lat, lon in points:
+        nearest = index.nearest(lat, lon)
+        if nearest is not None:
+            matches.append((address, nearest[0], nearest[1]))
+    return matches
+
+
+def save_spatial_matches(matches: list[tuple[str, str, float]], conn: sqlite3.Connection | None = None) -> None:
+    """
+    Save the spatial matches, and fill in the OPA account number on the matching AIS rows, with source 'spatial'.
+
+    Args:
+        matches: list of (address, opa_account_num, distance_m) tuples
+        conn: optional open connection to reuse (a new one is opened if not given)
+    """
+    with (conn or sqlite3.connect(sqlite_db)) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO spatial_matches (address, opa_account_num, distance_m, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            matches
+        )
+        cursor.executemany(
+            "UPDATE ais_addresses SET opa_account_num = ?, match_score = NULL, source = 'spatial', updated_at = CURRENT_TIMESTAMP WHERE address = ?",
+            [(opa_account_num, address) for address, opa_account_num, _ in matches]
+        )
+        conn.commit()
+
+
+def main(max_distance_m: float = 30.0) -> None:
+    """
+    Main function to resolve unmatched addresses to their nearest parcel.
+
+    Args:
+        max_distance_m: the maximum distance, in metres, between a case and the parcel it is assigned to
+    """
+    if not os.path.exists(parcel_centroids_file):
+        logger.info(f"No parcel centroid file at {parcel_centroids_file}, skipping spatial fallback")
+        return
+
+    init_spatial_table()
+    points = get_unresolved_points()
+    missing = count_unresolved_addresses() - len(points)
+    if missing > 0:
+        logger.warning(
+            f"{missing} unresolved addresses have no coordinates and can't be matched spatially; "
+            f"if the database predates the lat/lon columns, re-run the 311 download to backfill them"
+        )
+    if not points:
+        logger.info("No unresolved addresses with coordinates")
+        return
+
+    index = ParcelGridIndex(load_parcel_centroids(), max_distance_m)
+    matches = resolve_points(points, index)
+    save_spatial_matches(matches)
+    logger.info(f"Spatial fallback resolved {len(matches)} of {len(points)} unresolved addresses")
+
+
+if __name__ == "__main__":
+    main()
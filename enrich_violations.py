@@ -2,6 +2,7 @@
 Script to enrich 311 service requests with code violation counts using local database.
 """
 
+import json
 import logging
 import sqlite3
 
@@ -29,16 +30,26 @@ def init_violations_table() -> None:
     logger.info("Violation counts table initialized")
 
 
-def compute_violation_counts() -> None:
+def compute_violation_counts(opa_account_nums: list[str] | None = None, conn: sqlite3.Connection | None = None) -> None:
     """
     Compute violation counts for all service requests that have OPA account numbers.
     Uses a single SQL query to join and count efficiently.
+
+    Args:
+        opa_account_nums: if given, only recompute the service requests at these OPA accounts
+        conn: optional open connection to reuse (a new one is opened if not given)
     """
-    with sqlite3.connect(sqlite_db) as conn:
+    opa_filter = ""
+    params = ()
+    if opa_account_nums is not None:
+        opa_filter = "AND a.opa_account_num IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(opa_account_nums),)
+
+    with (conn or sqlite3.connect(sqlite_db)) as conn:
         cursor = conn.cursor()
         
         # Insert violation counts for all service requests in one query
-        cursor.execute("""
+        cursor.execute(f"""
             INSERT OR REPLACE INTO violation_counts 
                 (service_request_id, opa_account_num, violation_count, created_at, updated_at)
             SELECT 
@@ -53,8 +64,9 @@ def compute_violation_counts() -> None:
                 AND v.casecreateddate > p.requested_datetime
             WHERE a.opa_account_num IS NOT NULL
               AND a.opa_account_num != ''
+              {opa_filter}
             GROUP BY p.service_request_id, a.opa_account_num
-        """)
+        """, params)
         
         row_count = cursor.rowcount
         conn.commit()
@@ -0,0 +1,209 @@
+"""
+Trigram index over addresses that AIS has already resolved, used to catch typos and odd formats of
+known addresses before querying the AIS API.
+"""
+
+import re
+
+# Common long-form street words, mapped to the abbreviations AIS uses
+abbreviations = {
+    "STREET": "ST",
+    "AVENUE": "AVE",
+    "ROAD": "RD",
+    "BOULEVARD": "BLVD",
+    "DRIVE": "DR",
+    "LANE": "LN",
+    "PLACE": "PL",
+    "COURT": "CT",
+    "TERRACE": "TER",
+    "PARKWAY": "PKWY",
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "APARTMENT": "APT",
+    "FLOOR": "FL",
+    "SUITE": "STE",
+    "ROOM": "RM",
+}
+
+# Street directions, after normalization
+directions = {"N", "S", "E", "W", "NE", "NW", "SE", "SW"}
+
+# Tokens that start a unit designation; everything after one is part of the unit
+unit_keywords = {"APT", "UNIT", "#", "FL", "STE", "RM"}
+
+
+def normalize_address(address: str) -> str:
+    """
+    Normalize an address for fuzzy matching: uppercase, strip punctuation (keeping `#` as its own
+    token, since it marks a unit), abbreviate street words.
+
+    Args:
+        address: the address to normalize
+
+    Returns:
+        the normalized address
+    """
+    tokens = re.sub(r"[^A-Z0-9# ]", " ", address.upper().replace("#", " # ")).split()
+    return " ".join(abbreviations.get(token, token) for token in tokens)
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Get the set of character trigrams of a string, padded so short strings still produce trigrams.
+
+    Args:
+        text: the string
+
+    Returns:
+        the set of trigrams
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def house_number(normalized: str) -> str:
+    """
+    Get the leading house number of a normalized address, or an empty string if it has none.
+
+    Args:
+        normalized: the normalized address
+
+    Returns:
+        the house number
+    """
+    first = normalized.split(" ", 1)[0]
+    return first if first[:1].isdigit() else ""
+
+
+def street_direction(normalized: str) -> str:
+    """
+    Get the street direction of a normalized address (the N in "1234 N BROAD ST"), or an empty string
+    if it has none. The direction is the token after the house number, or the first token if there is
+    no house number.
+
+    Args:
+        normalized: the normalized address
+
+    Returns:
+        the direction
+    """
+    tokens = normalized.split(" ")
+    position = 1 if house_number(normalized) else 0
+    if position < len(tokens) and tokens[position] in directions:
+        return tokens[position]
+    return ""
+
+
+def unit_designation(normalized: str) -> str:
+    """
+    Get the unit designation of a normalized address (e.g. "APT 1B"), or an empty string if it has none.
+    The first token is never treated as a unit keyword, since it is the house number or street.
+
+    Args:
+        normalized: the normalized address
+
+    Returns:
+        the unit keyword and everything after it
+    """
+    tokens = normalized.split(" ")
+    for position in range(1, len(tokens)):
+        if tokens[position] in unit_keywords:
+            return " ".join(tokens[position:])
+    return ""
+
+
+def bucket_key(normalized: str) -> tuple[str, str, str]:
+    """
+    Get the parts of a normalized address that must match exactly for a fuzzy match.
+
+    Args:
+        normalized: the normalized address
+
+    Returns:
+        tuple of (house number, street direction, unit designation)
+    """
+    return house_number(normalized), street_direction(normalized), unit_designation(normalized)
+
+
+class TrigramIndex:
+    """
+    An inverted trigram index from addresses to OPA account numbers.
+
+    Entries are bucketed by house number, street direction and unit designation, and a query only
+    considers entries with exactly the same three. This keeps each lookup to a handful of candidates,
+    and stops "1234 MARKET ST" from matching "1243 MARKET ST", "1234 N PENNSYLVANIA AVE" from matching
+    "1234 S PENNSYLVANIA AVE", or "APT 1B" from matching "APT 1A", which would be different parcels
+    (condo units have their own OPA accounts).
+    """
+
+    def __init__(self, threshold: float = 0.85) -> None:
+        """
+        Create an empty index.
+
+        Args:
+            threshold: the minimum Dice similarity, between 0 and 1, for a match
+        """
+        self.threshold = threshold
+        self.entries: list[tuple[str, set[str], str]] = []
+        self.normalized: dict[str, int] = {}
+        self.postings: dict[tuple[str, str, str, str], list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, address: str, opa_account_num: str) -> None:
+        """
+        Add a resolved address to the index. Addresses that normalize to one already indexed are ignored.
+
+        Args:
+            address: the address
+            opa_account_num: the OPA account number AIS resolved it to
+        """
+        normalized = normalize_address(address)
+        if not normalized or normalized in self.normalized:
+            return
+        entry_id = len(self.entries)
+        grams = trigrams(normalized)
+        self.entries.append((opa_account_num, grams, address))
+        self.normalized[normalized] = entry_id
+        bucket = bucket_key(normalized)
+        for gram in grams:
+            self.postings.setdefault((*bucket, gram), []).append(entry_id)
+
+    def lookup(self, address: str) -> tuple[str, float, str] | None:
+        """
+        Find the most similar indexed address, if it is above the similarity threshold.
+
+        Args:
+            address: the address to look up
+
+        Returns:
+            tuple of (opa_account_num, similarity score, indexed address), or None if nothing is similar enough
+        """
+        normalized = normalize_address(address)
+        if not normalized:
+            return None
+        if normalized in self.normalized:
+            opa_account_num, _, matched_address = self.entries[self.normalized[normalized]]
+            return opa_account_num, 1.0, matched_address
+
+        grams = trigrams(normalized)
+        bucket = bucket_key(normalized)
+        shared: dict[int, int] = {}
+        for gram in grams:
+            for entry_id in self.postings.get((*bucket, gram), ()):
+                shared[entry_id] = shared.get(entry_id, 0) + 1
+
+        best = None
+        best_score = self.threshold
+        for entry_id, count in shared.items():
+            score = 2 * count / (len(grams) + len(self.entries[entry_id][1]))
+            if score >= best_score:
+                best = entry_id
+                best_score = score
+        if best is None:
+            return None
+        opa_account_num, _, matched_address = self.entries[best]
+        return opa_account_num, best_score, matched_address
@@ -2,6 +2,7 @@
 Script to generate a summary report of 311 service requests and code violations.
 """
 
+import os
 import sqlite3
 from datetime import datetime
 import logging
@@ -26,6 +27,11 @@ def generate_report() -> str:
         cursor.execute("SELECT COUNT(*) FROM public_cases_fc")
         total_requests = cursor.fetchone()[0]
 
+        # Period covered: a one-shot run covers 2025, but daemon mode follows the data to the present
+        cursor.execute("SELECT MIN(requested_datetime), MAX(requested_datetime) FROM public_cases_fc")
+        first_request, last_request = cursor.fetchone()
+        period = f"{first_request[:10]} to {last_request[:10]}" if total_requests > 0 else "no service requests"
+
         # Service requests with matching code violations (violation_count > 0)
         cursor.execute("""
             SELECT COUNT(*) FROM violation_counts 
@@ -44,6 +50,7 @@ def generate_report() -> str:
     # Build report
     report = f"""311 Service Requests Report
 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+Period: {period}
 {'=' * 50}
 
 Total Service Requests: {total_requests:,}
@@ -61,9 +68,11 @@ def main() -> None:
     """
     report = generate_report()
     
-    # Save to file
-    with open(report_file, 'w') as f:
+    # Save to a temporary file and rename it over the report, so readers never see a partial report
+    temp_file = f"{report_file}.tmp"
+    with open(temp_file, 'w') as f:
         f.write(report)
+    os.replace(temp_file, report_file)
     
     logger.info(f"Report saved to {report_file}")
 
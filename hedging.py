@@ -0,0 +1,138 @@
+"""
+Request hedging, to cut the tail latency of AIS lookups. When a request takes longer than the
+observed p95 latency, one duplicate is sent, and whichever answers first is used. A hedge budget
+caps the extra load the duplicates put on the API.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Hedger:
+    """
+    Runs calls with at most one hedged duplicate each, tracking latency and hedge counts.
+    Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        budget: float = 0.05,
+        percentile: float = 0.95,
+        min_samples: int = 50,
+        window: int = 1000,
+    ) -> None:
+        """
+        Create a hedger.
+
+        Args:
+            max_workers: number of threads for primary and duplicate calls; should be about twice
+                the number of threads making calls
+            budget: the maximum fraction of calls that may be hedged
+            percentile: the latency percentile after which a call is hedged
+            min_samples: the number of latency samples needed before any call is hedged
+            window: the number of recent latency samples the percentile is computed over
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __enter__(self) -> "Hedger":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        """
+        Shut down the executor, without waiting for losing duplicates to finish.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def hedge_delay(self) -> float | None:
+        """
+        Get the current hedge delay, the observed latency percentile.
+
+        Returns:
+            the delay in seconds, or None if there aren't enough samples yet
+        """
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * self.percentile), len(ordered) - 1)]
+
+    def _reserve_hedge(self) -> bool:
+        with self.lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Call `fn(*args)`, sending one duplicate call if the first is slower than the hedge delay
+        and the hedge budget allows it. Returns the first successful result; if every call
+        fails, raises the last exception.
+
+        Args:
+            fn: the function to call
+            args: the arguments to call it with
+
+        Returns:
+            the result of the first call to succeed
+        """
+        with self.lock:
+            self.requests += 1
+        start = time.monotonic()
+        primary = self.executor.submit(fn, *args)
+        pending: set[Future] = {primary}
+
+        delay = self.hedge_delay()
+        if delay is not None:
+            done, pending = wait(pending, timeout=delay)
+            if not done and self._reserve_hedge():
+                pending.add(self.executor.submit(fn, *args))
+            pending |= done
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                with self.lock:
+                    self.latencies.append(time.monotonic() - start)
+                    if future is not primary:
+                        self.hedge_wins += 1
+                return future.result()
+        raise error
+
+    def metrics(self) -> dict[str, float]:
+        """
+        Get the hedging metrics.
+
+        Returns:
+            a dictionary of requests, hedges sent, hedges that answered first, and the current hedge delay
+        """
+        delay = self.hedge_delay()
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedge_delay": delay if delay is not None else 0.0,
+            }
@@ -0,0 +1,361 @@
+"""
+Local read-only HTTP/JSON service over the enriched SQLite database, for per-address and per-OPA answers.
+
+Endpoints:
+- GET /address?address=<address>: the tickets at an address, and how many led to violations
+- GET /opa/<opa_account_num>: the same, for every address resolved to an OPA account
+- GET /health: cache statistics
+
+Queries run on a pool of read-only connections, and results are kept in an LRU cache. The cache is
+cleared when the pipeline finishes a run, which it signals by touching `run_marker_file`.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, unquote, urlparse
+
+sqlite_db = "data/311_service_requests.db"
+run_marker_file = "data/pipeline_complete"
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+address_query = """
+    SELECT p.service_request_id, p.status, p.requested_datetime, a.opa_account_num, v.violation_count
+    FROM public_cases_fc p
+    LEFT JOIN ais_addresses a ON p.address = a.address
+    LEFT JOIN violation_counts v ON p.service_request_id = v.service_request_id
+    WHERE p.address = ?
+    ORDER BY p.requested_datetime
+"""
+
+opa_query = """
+    SELECT p.address, p.service_request_id, p.status, p.requested_datetime, v.violation_count
+    FROM ais_addresses a
+    INNER JOIN public_cases_fc p ON p.address = a.address
+    LEFT JOIN violation_counts v ON p.service_request_id = v.service_request_id
+    WHERE a.opa_account_num = ?
+    ORDER BY p.requested_datetime
+"""
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded least-recently-used cache.
+    """
+
+    def __init__(self, max_size: int = 10000) -> None:
+        """
+        Create an empty cache.
+
+        Args:
+            max_size: the maximum number of entries before the least recently used is evicted
+        """
+        self.max_size = max_size
+        self.entries: OrderedDict[Any, Any] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Any | None:
+        """
+        Get a cached value, marking it as recently used.
+
+        Args:
+            key: the cache key
+
+        Returns:
+            the cached value, or None if it isn't cached
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        """
+        Cache a value, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key: the cache key
+            value: the value
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove every entry.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the cache statistics.
+
+        Returns:
+            a dictionary of size, hits and misses
+        """
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class ConnectionPool:
+    """
+    A fixed-size pool of read-only SQLite connections, shared between request threads.
+    """
+
+    def __init__(self, path: str, size: int = 8) -> None:
+        """
+        Open the connections.
+
+        Args:
+            path: the path to the SQLite database
+            size: the number of connections
+        """
+        self.closed = False
+        self.connections: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(size):
+            self.connections.put(sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False))
+
+    def execute(self, query: str, params: tuple) -> list[tuple]:
+        """
+        Run a query on a pooled connection. Queries are kept as constant strings, so each
+        connection's statement cache reuses their prepared statements.
+
+        Args:
+            query: the SQL query
+            params: the query parameters
+
+        Returns:
+            the result rows
+        """
+        conn = self.connections.get()
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            if self.closed:
+                conn.close()
+            else:
+                self.connections.put(conn)
+
+    def close(self) -> None:
+        """
+        Close the idle connections. Connections in use by a query are closed when it finishes.
+        """
+        self.closed = True
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class QueryService:
+    """
+    Answers per-address and per-OPA queries, with results cached until the next pipeline run.
+    """
+
+    def __init__(self, path: str = sqlite_db, pool_size: int = 8, cache_size: int = 10000) -> None:
+        """
+        Create the service.
+
+        Args:
+            path: the path to the SQLite database
+            pool_size: the number of read-only connections
+            cache_size: the maximum number of cached results
+        """
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = ConnectionPool(path, pool_size)
+        self.cache = LRUCache(cache_size)
+        self.run_marker_mtime = self._run_marker_mtime()
+        self.lock = threading.Lock()
+
+    def _run_marker_mtime(self) -> float | None:
+        try:
+            return os.stat(run_marker_file).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def check_invalidation(self) -> None:
+        """
+        Reopen the connection pool and clear the cache if the pipeline has finished a run since the
+        last check. The pool is reopened because `--clean` replaces the database file, and connections
+        to the old file would keep reading it.
+        """
+        with self.lock:
+            mtime = self._run_marker_mtime()
+            if mtime == self.run_marker_mtime:
+                return
+            old_pool = self.pool
+            self.pool = ConnectionPool(self.path, self.pool_size)
+            old_pool.close()
+            self.run_marker_mtime = mtime
+            self.cache.clear()
+            logger.info("Pipeline run finished, connections reopened and cache cleared")
+
+    def cached(self, key: tuple, query: str, params: tuple, build: Any) -> dict:
+        """
+        Get a result from the cache, or run the query and build it.
+
+        Args:
+            key: the cache key
+            query: the SQL query
+            params: the query parameters
+            build: a function from the result rows to the response
+
+        Returns:
+            the response
+        """
+        self.check_invalidation()
+        result = self.cache.get(key)
+        if result is None:
+            result = build(self.pool.execute(query, params))
+            self.cache.put(key, result)
+        return result
+
+    def address(self, address: str) -> dict:
+        """
+        Get the tickets at an address, and how many led to violations.
+
+        Args:
+            address: the address, as it appears in the 311 data
+
+        Returns:
+            the response
+        """
+        def build(rows: list[tuple]) -> dict:
+            tickets = [
+                {"service_request_id": sr_id, "status": status, "requested_datetime": requested, "violation_count": count or 0}
+                for sr_id, status, requested, _, count in rows
+            ]
+            return {
+                "address": address,
+                "opa_account_num": rows[0][3] if rows else None,
+                **summarize(tickets),
+                "tickets": tickets,
+            }
+
+        return self.cached(("address", address), address_query, (address,), build)
+
+    def opa(self, opa_account_num: str) -> dict:
+        """
+        Get the tickets at every address resolved to an OPA account, and how many led to violations.
+
+        Args:
+            opa_account_num: the OPA account number
+
+        Returns:
+            the response
+        """
+        def build(rows: list[tuple]) -> dict:
+            tickets = [
+                {"address": address, "service_request_id": sr_id, "status": status, "requested_datetime": requested, "violation_count": count or 0}
+                for address, sr_id, status, requested, count in rows
+            ]
+            return {
+                "opa_account_num": opa_account_num,
+                "addresses": sorted({ticket["address"] for ticket in tickets}),
+                **summarize(tickets),
+                "tickets": tickets,
+            }
+
+        return self.cached(("opa", opa_account_num), opa_query, (opa_account_num,), build)
+
+
+def summarize(tickets: list[dict]) -> dict[str, int]:
+    """
+    Summarize a list of tickets.
+
+    Args:
+        tickets: the tickets, each with a status and violation_count
+
+    Returns:
+        a dictionary of ticket counts: total, with violations, and open
+    """
+    return {
+        "total_tickets": len(tickets),
+        "tickets_with_violations": sum(1 for ticket in tickets if ticket["violation_count"] > 0),
+        "open_tickets": sum(1 for ticket in tickets if (ticket["status"] or "").lower() == "open"),
+    }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Routes HTTP requests to the QueryService attached to the server.
+    """
+
+    def do_GET(self) -> None:
+        try:
+            self.route()
+        except sqlite3.Error as e:
+            logger.exception(f"Query failed for {self.path}")
+            self.send_json(500, {"error": f"database error: {e}"})
+
+    def route(self) -> None:
+        service: QueryService = self.server.service
+        url = urlparse(self.path)
+        if url.path == "/address":
+            address = parse_qs(url.query).get("address", [""])[0]
+            if not address:
+                self.send_json(400, {"error": "missing address parameter"})
+                return
+            self.send_json(200, service.address(address))
+        elif url.path.startswith("/opa/") and len(url.path) > len("/opa/"):
+            self.send_json(200, service.opa(unquote(url.path[len("/opa/"):])))
+        elif url.path == "/health":
+            self.send_json(200, {"status": "ok", "cache": service.cache.stats()})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+
+def main(host: str = "127.0.0.1", port: int = 8000) -> None:
+    """
+    Main function to serve queries over the enriched database until interrupted.
+
+    Args:
+        host: the interface to listen on
+        port: the port to listen on
+    """
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.service = QueryService()
+    logger.info(f"Serving queries on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    if '--port' in sys.argv:
+        main(port=int(sys.argv[sys.argv.index('--port') + 1]))
+    else:
+        main()
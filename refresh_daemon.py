@@ -0,0 +1,262 @@
+"""
+Long-running refresh of the pipeline in micro-batches. Stays resident with a warm HTTP session,
+database connection, fuzzy match index and parcel index, and every few minutes:
+1. Pulls 311 service requests and violations newer than the local watermarks (less an overlap, to catch late rows)
+2. Resolves only the addresses that haven't been enriched yet, and pulls the violations of OPA accounts
+   seen for the first time from their earliest ticket date, since the violations watermark may be later
+3. Recomputes violation counts only for the OPA accounts touched by the new rows
+4. Regenerates the report atomically, and signals the query service to drop its cache
+
+Run it through `python run_pipeline.py --daemon`, which does a full run first.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+import requests
+
+import download_311
+import download_violations
+import enrich_ais
+import enrich_spatial
+import enrich_violations
+import generate_report
+
+sqlite_db = "data/311_service_requests.db"
+run_marker_file = "data/pipeline_complete"
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parse a Carto timestamp, which may end in `Z`. datetime.fromisoformat only accepts `Z` from
+    Python 3.11, so it is replaced with an explicit UTC offset first.
+
+    Args:
+        value: the timestamp, e.g. 2025-12-30T14:05:00Z, or a date
+
+    Returns:
+        the parsed timestamp
+    """
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+class RefreshDaemon:
+    """
+    Holds the resources that are kept warm between refreshes, and runs each refresh.
+    """
+
+    def __init__(self, overlap: timedelta = timedelta(days=1), max_workers: int = 300) -> None:
+        """
+        Open the session and connection, and build the in-memory indexes.
+
+        Args:
+            overlap: how far before each watermark to re-pull, to catch rows that arrived late
+            max_workers: number of parallel threads for AIS lookups
+        """
+        self.overlap = overlap
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.conn = sqlite3.connect(sqlite_db)
+        self.index = enrich_ais.build_fuzzy_index()
+        self.parcel_index = None
+        if os.path.exists(enrich_spatial.parcel_centroids_file):
+            enrich_spatial.init_spatial_table()
+            self.parcel_index = enrich_spatial.ParcelGridIndex(enrich_spatial.load_parcel_centroids(), 30.0)
+
+    def close(self) -> None:
+        """
+        Close the session and connection.
+        """
+        self.session.close()
+        self.conn.close()
+
+    def watermark(self, table: str, date_column: str) -> str:
+        """
+        Get the date to pull new rows from: the newest local row, less the overlap.
+
+        Args:
+            table: the local table
+            date_column: the column the table is ordered by in time
+
+        Returns:
+            the watermark, as an ISO timestamp
+        """
+        latest = self.conn.execute(f"SELECT MAX({date_column}) FROM {table}").fetchone()[0]
+        if latest is None:
+            return "2025-01-01"
+        return (parse_timestamp(latest) - self.overlap).strftime("%Y-%m-%dT%H:%M:%S")
+
+    def pull(
+        self,
+        download: Callable[..., list[dict]],
+        save: Callable[..., None],
+        key: str,
+        start_date: str,
+        end_date: str,
+        limit: int = 10000,
+    ) -> tuple[int, set[str]]:
+        """
+        Page through a Carto download function from a start date, saving each page on the daemon's
+        connection as it arrives. Only one page is held in memory, so a long gap since the last run
+        (such as the first refresh after a full run) doesn't load the whole gap at once.
+
+        Args:
+            download: get_311_service_requests or get_violations
+            save: the matching save_data function
+            key: the column to collect from the downloaded rows
+            start_date: the earliest date to include
+            end_date: the exclusive upper date bound
+            limit: the number of records to download in each batch
+
+        Returns:
+            tuple of (number of rows downloaded, the distinct non-empty values of `key`)
+        """
+        total = 0
+        keys = set()
+        offset = 0
+        while True:
+            data = download(limit, offset, start_date, end_date, self.session)
+            save(data, conn=self.conn)
+            total += len(data)
+            keys.update(row[key] for row in data if row[key])
+            if len(data) < limit:
+                return total, keys
+            offset += limit
+
+    def resolve_new_addresses(self) -> list[str]:
+        """
+        Resolve the addresses that haven't been enriched yet, with the fuzzy match index, the AIS API,
+        and the spatial fallback if a parcel-centroid file is available.
+
+        Returns:
+            the addresses that were resolved or matched spatially
+        """
+        addresses = [row[0] for row in self.conn.execute("""
+            SELECT DISTINCT p.address
+            FROM public_cases_fc p
+            LEFT JOIN ais_addresses a ON p.address = a.address
+            WHERE a.address IS NULL AND p.address IS NOT NULL
+        """).fetchall()]
+        for start in range(0, len(addresses), self.max_workers):
+            batch = addresses[start:start + self.max_workers]
+            enrich_ais.resolve_batch(batch, self.session, self.index, max_workers=self.max_workers, conn=self.conn)
+
+        if self.parcel_index is not None:
+            matches = enrich_spatial.resolve_points(enrich_spatial.get_unresolved_points(), self.parcel_index)
+            enrich_spatial.save_spatial_matches(matches, conn=self.conn)
+            addresses.extend(address for address, _, _ in matches)
+        return addresses
+
+    def pull_new_account_violations(self, demand_before: dict[str, str]) -> tuple[int, set[str]]:
+        """
+        Pull the violations of OPA accounts that are new to the demand set (or whose earliest ticket
+        moved earlier), from their earliest ticket date. The violations watermark only covers accounts
+        whose violations were already downloaded, and after a demand-mode run it can be much later
+        than a new account's tickets.
+
+        Args:
+            demand_before: the OPA demand (account to earliest ticket date) before the new addresses were resolved
+
+        Returns:
+            tuple of (number of violations downloaded, the OPA accounts they belong to)
+        """
+        demand = download_violations.get_opa_demand()
+        new_demand = {
+            opa: since for opa, since in demand.items()
+            if opa not in demand_before or since < demand_before[opa]
+        }
+        total = 0
+        opa_account_nums_seen = set()
+        for since, opa_account_nums in download_violations.chunk_demand(new_demand, 200):
+            data = download_violations.get_violations_for_opa(opa_account_nums, since, self.session)
+            download_violations.save_data(data, conn=self.conn)
+            total += len(data)
+            opa_account_nums_seen.update(row['opa_account_num'] for row in data if row['opa_account_num'])
+        return total, opa_account_nums_seen
+
+    def refresh(self) -> None:
+        """
+        Pull the newest rows, enrich and rematch only what they affect, and refresh the report.
+        """
+        start = time.monotonic()
+        end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+        case_count, case_addresses = self.pull(
+            download_311.get_311_service_requests,
+            lambda data, conn: download_311.save_data(data, replace=True, conn=conn),
+            "address",
+            self.watermark("public_cases_fc", "requested_datetime"),
+            end_date,
+        )
+        violation_count, affected = self.pull(
+            download_violations.get_violations,
+            download_violations.save_data,
+            "opa_account_num",
+            self.watermark("violations", "casecreateddate"),
+            end_date,
+        )
+
+        demand_before = download_violations.get_opa_demand()
+        addresses = self.resolve_new_addresses()
+        addresses.extend(case_addresses)
+        new_violation_count, new_violation_accounts = self.pull_new_account_violations(demand_before)
+        violation_count += new_violation_count
+
+        affected.update(new_violation_accounts)
+        affected.update(row[0] for row in self.conn.execute("""
+            SELECT DISTINCT opa_account_num FROM ais_addresses
+            WHERE address IN (SELECT value FROM json_each(?)) AND opa_account_num != ''
+        """, (json.dumps(addresses),)).fetchall())
+        enrich_violations.compute_violation_counts(sorted(affected), conn=self.conn)
+
+        generate_report.main()
+        with open(run_marker_file, 'w') as f:
+            f.write(datetime.now().isoformat())
+
+        logger.info(
+            f"Refreshed {case_count} service requests, {violation_count} violations, "
+            f"{len(affected)} OPA accounts in {time.monotonic() - start:.1f}s"
+        )
+
+
+def main(interval_minutes: float = 5) -> None:
+    """
+    Main function to refresh the pipeline every `interval_minutes` until interrupted. A failed
+    refresh is logged and retried at the next interval.
+
+    Args:
+        interval_minutes: the time between the starts of consecutive refreshes
+    """
+    download_311.init_database()
+    download_violations.init_database()
+    enrich_ais.init_ais_table()
+    enrich_violations.init_violations_table()
+    daemon = RefreshDaemon()
+    logger.info(f"Refreshing every {interval_minutes} minutes")
+    try:
+        while True:
+            start = time.monotonic()
+            try:
+                daemon.refresh()
+            except Exception as e:
+                logger.exception(f"Refresh failed: {e}")
+            time.sleep(max(0.0, interval_minutes * 60 - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        logger.info("Stopping refresh daemon")
+    finally:
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
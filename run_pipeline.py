@@ -5,10 +5,13 @@ Main pipeline script to download, enrich, and generate reports for Philadelphia
 import os
 import logging
 import sys
+from datetime import datetime
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 sqlite_db = "data/311_service_requests.db"
+# Touched when a run finishes, so the query service knows to drop its cache
+run_marker_file = "data/pipeline_complete"
 
 
 def main() -> None:
@@ -17,10 +20,12 @@ def main() -> None:
     0. Clean database (optional)
     1. Create data folder
     2. Download 311 service requests
-    3. Download violations
-    4. Enrich with AIS data (OPA account numbers)
-    5. Enrich with violation counts
-    6. Generate report
+    3. Enrich with AIS data (OPA account numbers)
+    4. Resolve addresses AIS couldn't match to their nearest parcel
+    5. Download violations (for the resolved OPA accounts, or the full table, whichever is cheaper)
+    6. Enrich with violation counts
+    7. Generate report
+    8. With --daemon, refresh every --interval minutes (default 5) until interrupted
     """
 
     if '--log-level' in sys.argv:
@@ -31,6 +36,11 @@ def main() -> None:
 
     clean = '--clean' in sys.argv
 
+    if '--violations-mode' in sys.argv:
+        violations_mode = sys.argv[sys.argv.index('--violations-mode') + 1]
+    else:
+        violations_mode = "auto"
+
     if clean:
         logger.info("Cleaning database...")
         if os.path.exists(sqlite_db):
@@ -47,28 +57,45 @@ def main() -> None:
     import download_311
     download_311.main()
     
-    # Step 3: Download violations
-    logger.info("Step 3: Downloading violations...")
-    import download_violations
-    download_violations.main()
-    
-    # Step 4: Enrich with AIS data
-    logger.info("Step 4: Enriching addresses with AIS data...")
+    # Step 3: Enrich with AIS data
+    logger.info("Step 3: Enriching addresses with AIS data...")
     import enrich_ais
-    enrich_ais.main()
+    enrich_ais.main(hedge='--hedge' in sys.argv)
+    
+    # Step 4: Spatial fallback for addresses AIS couldn't resolve
+    logger.info("Step 4: Resolving unmatched addresses to nearest parcels...")
+    import enrich_spatial
+    enrich_spatial.main()
     
-    # Step 5: Enrich with violation counts
-    logger.info("Step 5: Enriching with violation counts...")
+    # Step 5: Download violations, after AIS so the resolved OPA accounts are known
+    logger.info("Step 5: Downloading violations...")
+    import download_violations
+    download_violations.main(violations_mode)
+    
+    # Step 6: Enrich with violation counts
+    logger.info("Step 6: Enriching with violation counts...")
     import enrich_violations
     enrich_violations.main()
     
-    # Step 6: Generate report
-    logger.info("Step 6: Generating report...")
+    # Step 7: Generate report
+    logger.info("Step 7: Generating report...")
     import generate_report
     generate_report.main()
+
+    with open(run_marker_file, 'w') as f:
+        f.write(datetime.now().isoformat())
     
     logger.info("Pipeline complete!")
 
+    # Optionally stay resident and refresh in micro-batches
+    if '--daemon' in sys.argv:
+        if '--interval' in sys.argv:
+            interval_minutes = float(sys.argv[sys.argv.index('--interval') + 1])
+        else:
+            interval_minutes = 5
+        import refresh_daemon
+        refresh_daemon.main(interval_minutes)
+
 
 if __name__ == "__main__":
     main()
@@ -87,10 +87,33 @@ def test_save_data() -> None:
 
     logger.debug("test_save_data passed")
 
+def test_save_data_backfills_coordinates() -> None:
+    """
+    Test that save_data fills in coordinates for an existing record that has none, and leaves
+    existing coordinates alone.
+    """
+    logger.debug("Running test_save_data_backfills_coordinates...")
+    init_database()
+    record = {
+        'service_request_id': 'test_3',
+        'status': 'open',
+        'address': '123 Main St, Philadelphia, PA 19101',
+        'requested_datetime': '2025-01-03'
+    }
+    save_data([record])
+    save_data([{**record, 'lat': 39.95, 'lon': -75.16}])
+    save_data([{**record, 'lat': 40.0, 'lon': -75.0}])
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT lat, lon FROM public_cases_fc WHERE service_request_id = 'test_3'")
+        assert cursor.fetchone() == (39.95, -75.16)
+    logger.debug("test_save_data_backfills_coordinates passed")
+
 
 if __name__ == "__main__":
     logger.info("Running tests...")
     logger.setLevel(logging.DEBUG)
     test_init_database()
     test_save_data()
+    test_save_data_backfills_coordinates()
     logger.info("Tests completed successfully")
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+Test script for download_violations.py
+"""
+
+import logging
+from download_violations import (
+    chunk_demand,
+    estimate_costs,
+)
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def test_chunk_demand() -> None:
+    """
+    Test the chunk_demand function. Chunks should be ordered by earliest ticket date, and each
+    chunk should start from the earliest date it contains.
+    """
+    logger.debug("Running test_chunk_demand...")
+
+    demand = {
+        "111": "2025-03-01",
+        "222": "2025-01-15",
+        "333": "2025-12-30",
+        "444": "2025-02-01",
+        "555": "2025-01-15",
+    }
+    chunks = chunk_demand(demand, 2)
+
+    assert len(chunks) == 3
+    assert chunks[0] == ("2025-01-15", ["222", "555"])
+    assert chunks[1] == ("2025-02-01", ["444", "111"])
+    assert chunks[2] == ("2025-12-30", ["333"])
+    assert chunk_demand({}, 2) == []
+
+    logger.debug("test_chunk_demand passed")
+
+
+def test_estimate_costs() -> None:
+    """
+    Test the estimate_costs function. A small set of OPA accounts should favour the demand-driven
+    download, and a set covering the whole table should favour the full download.
+    """
+    logger.debug("Running test_estimate_costs...")
+
+    full_cost, demand_cost = estimate_costs(500, 200000, 220000, 60000)
+    logger.debug(f"Small demand: full={full_cost}, demand={demand_cost}")
+    assert demand_cost < full_cost
+
+    full_cost, demand_cost = estimate_costs(60000, 200000, 220000, 60000)
+    logger.debug(f"Large demand: full={full_cost}, demand={demand_cost}")
+    assert full_cost < demand_cost
+
+    logger.debug("test_estimate_costs passed")
+
+
+if __name__ == "__main__":
+    logger.info("Running download_violations tests...")
+
+    test_chunk_demand()
+    test_estimate_costs()
+
+    logger.info("All download_violations tests passed!")
@@ -4,13 +4,24 @@ Test script for enrich_ais.py
 
 import logging
 import sqlite3
+import time
 import requests
+import download_311
+import enrich_spatial
 from enrich_ais import (
     sqlite_db,
     init_ais_table,
     get_unique_addresses,
     lookup_ais,
     save_ais_data,
+    extract_opa_account_num,
+    save_ais_response,
+    rederive_ais_addresses,
+    build_fuzzy_index,
+    claim_work_range,
+    renew_lease,
+    complete_work_range,
+    count_pending_ranges,
 )
 
 logging.basicConfig(level=logging.DEBUG)
@@ -73,6 +84,25 @@ def test_get_unique_addresses() -> None:
     logger.debug("test_get_unique_addresses passed")
 
 
+def test_get_unique_addresses_batches(temp_database: str) -> None:
+    """
+    Test that get_unique_addresses yields each unresolved address once across several batches, and
+    stops, even though none of them are resolved while it runs.
+    """
+    logger.debug("Running test_get_unique_addresses_batches...")
+
+    download_311.save_data([
+        {'service_request_id': f"test_batch_{i}", 'status': 'open', 'address': f"{i:03d} TEST ST", 'requested_datetime': '2025-01-01'}
+        for i in range(5)
+    ])
+    save_ais_data("001 TEST ST", "123456789")
+
+    addresses = list(get_unique_addresses(batch_size=2))
+    assert addresses == ["000 TEST ST", "002 TEST ST", "003 TEST ST", "004 TEST ST"], addresses
+
+    logger.debug("test_get_unique_addresses_batches passed")
+
+
 def test_lookup_ais_success() -> None:
     """
     Test the lookup_ais function with a known valid address.
@@ -145,6 +175,158 @@ def test_save_ais_data() -> None:
     logger.debug("test_save_ais_data passed")
 
 
+def test_extract_opa_account_num() -> None:
+    """
+    Test the extract_opa_account_num function.
+    """
+    logger.debug("Running test_extract_opa_account_num...")
+
+    data = {"features": [{"properties": {"opa_account_num": "883309050"}}, {"properties": {"opa_account_num": "111"}}]}
+    assert extract_opa_account_num(data) == "883309050"
+    assert extract_opa_account_num({"features": []}) == ""
+    assert extract_opa_account_num({"features": [{"properties": {"opa_account_num": None}}]}) == ""
+    assert extract_opa_account_num({}) == ""
+
+    logger.debug("test_extract_opa_account_num passed")
+
+
+def test_rederive_ais_addresses() -> None:
+    """
+    Test the rederive_ais_addresses function. A stale OPA account number should be replaced with
+    the one extracted from the stored AIS response.
+    """
+    logger.debug("Running test_rederive_ais_addresses...")
+
+    test_address = "TEST_REDERIVE_ADDRESS_24680"
+    data = {"features": [{"properties": {"opa_account_num": "987654321"}}]}
+
+    init_ais_table()
+
+    try:
+        save_ais_data(test_address, "stale")
+        save_ais_response(test_address, data)
+        rederive_ais_addresses()
+
+        with sqlite3.connect(sqlite_db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT opa_account_num FROM ais_addresses WHERE address = ?", (test_address,))
+            result = cursor.fetchone()
+            assert result[0] == "987654321", f"OPA account should be re-derived: {result[0]}"
+
+    finally:
+        with sqlite3.connect(sqlite_db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM ais_addresses WHERE address = ?", (test_address,))
+            cursor.execute("DELETE FROM ais_responses WHERE address = ?", (test_address,))
+            conn.commit()
+
+    logger.debug("test_rederive_ais_addresses passed")
+
+
+def test_rederive_keeps_spatial_matches(temp_database: str) -> None:
+    """
+    Test that rederive_ais_addresses leaves addresses filled in by the spatial fallback alone, even
+    though their stored AIS response has no OPA account number.
+    """
+    logger.debug("Running test_rederive_keeps_spatial_matches...")
+
+    test_address = "TEST_REDERIVE_SPATIAL_13579"
+
+    save_ais_response(test_address, {"features": [{"properties": {"opa_account_num": ""}}]})
+    save_ais_data(test_address, "")
+    enrich_spatial.save_spatial_matches([(test_address, "883309050", 8.5)])
+
+    assert rederive_ais_addresses() == 0
+
+    with sqlite3.connect(temp_database) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT opa_account_num, source FROM ais_addresses WHERE address = ?", (test_address,))
+        result = cursor.fetchone()
+        assert result == ("883309050", "spatial"), f"Spatial match should survive re-derivation: {result}"
+
+    logger.debug("test_rederive_keeps_spatial_matches passed")
+
+
+def test_rederive_propagates_to_fuzzy_matches(temp_database: str) -> None:
+    """
+    Test that when re-derivation changes an AIS-resolved address, its fuzzy matches are changed too.
+    """
+    logger.debug("Running test_rederive_propagates_to_fuzzy_matches...")
+
+    save_ais_data("1400 JOHN F KENNEDY BLVD", "stale")
+    save_ais_response("1400 JOHN F KENNEDY BLVD", {"features": [{"properties": {"opa_account_num": "883309050"}}]})
+    save_ais_data("1400 JOHN F KENEDY BLVD", "stale", 0.9, "1400 JOHN F KENNEDY BLVD")
+    save_ais_data("1400 J F KENNEDY BLVD", "stale", 0.86, "1400 JOHN F KENNEDY BLVD")
+    save_ais_data("1401 JOHN F KENEDY BLVD", "111111111", 0.9, "1401 JOHN F KENNEDY BLVD")
+
+    assert rederive_ais_addresses() == 3
+
+    with sqlite3.connect(temp_database) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT address, opa_account_num, source FROM ais_addresses ORDER BY address")
+        assert cursor.fetchall() == [
+            ("1400 J F KENNEDY BLVD", "883309050", "fuzzy"),
+            ("1400 JOHN F KENEDY BLVD", "883309050", "fuzzy"),
+            ("1400 JOHN F KENNEDY BLVD", "883309050", "ais"),
+            ("1401 JOHN F KENEDY BLVD", "111111111", "fuzzy"),
+        ]
+
+    assert rederive_ais_addresses() == 0
+
+    logger.debug("test_rederive_propagates_to_fuzzy_matches passed")
+
+
+def test_build_fuzzy_index_only_ais(temp_database: str) -> None:
+    """
+    Test that the fuzzy match index only holds addresses the AIS API resolved, not fuzzy or spatial matches.
+    """
+    logger.debug("Running test_build_fuzzy_index_only_ais...")
+
+    save_ais_data("1400 JOHN F KENNEDY BLVD", "883309050")
+    save_ais_data("1401 JOHN F KENNEDY BLVD", "111111111", 0.9)
+    save_ais_data("100 GUESSED ST", "")
+    enrich_spatial.save_spatial_matches([("100 GUESSED ST", "222222222", 12.0)])
+
+    index = build_fuzzy_index()
+
+    assert len(index) == 1, f"Only the AIS-resolved address should be indexed, got {len(index)}"
+    assert index.lookup("1400 JOHN F KENEDY BLVD") is not None
+    assert index.lookup("100 GUESSED STT") is None, "Spatial guesses should not be matched"
+
+    logger.debug("test_build_fuzzy_index_only_ais passed")
+
+
+def test_work_range_leases(temp_database: str) -> None:
+    """
+    Test the work range leases: ranges are planned and claimed, an expired lease is reclaimed by
+    another worker, the old owner can then neither renew nor complete it, and the new owner can.
+    """
+    logger.debug("Running test_work_range_leases...")
+
+    download_311.save_data([
+        {'service_request_id': f"test_lease_{i}", 'status': 'open', 'address': f"{i:03d} TEST ST", 'requested_datetime': '2025-01-01'}
+        for i in range(5)
+    ])
+
+    assert claim_work_range("worker_a", 0.05, range_size=3) == (1, "000 TEST ST", "002 TEST ST")
+    assert claim_work_range("worker_b", 60, range_size=3) == (2, "003 TEST ST", "004 TEST ST")
+    # every range is leased, so there is nothing to claim until a lease expires
+    assert claim_work_range("worker_c", 60, range_size=3) is None
+    assert count_pending_ranges() == 2
+
+    time.sleep(0.1)
+    assert claim_work_range("worker_c", 60, range_size=3) == (1, "000 TEST ST", "002 TEST ST")
+    assert not renew_lease(1, "worker_a", 60), "The old owner should have lost the lease"
+    assert renew_lease(1, "worker_c", 60)
+
+    complete_work_range(1, "worker_a")
+    assert count_pending_ranges() == 2, "The old owner should not be able to complete the range"
+    complete_work_range(1, "worker_c")
+    assert count_pending_ranges() == 1
+
+    logger.debug("test_work_range_leases passed")
+
+
 if __name__ == "__main__":
     logger.info("Running enrich_ais tests...")
     
@@ -153,5 +335,8 @@ if __name__ == "__main__":
     test_lookup_ais_success()
     test_lookup_ais_failure()
     test_save_ais_data()
+    test_extract_opa_account_num()
+    test_rederive_ais_addresses()
+    # the tests that take the temp_database fixture (conftest.py) only run under pytest
     
     logger.info("All enrich_ais tests passed!")
@@ -0,0 +1,70 @@
+"""
+Test script for enrich_spatial.py
+"""
+
+import logging
+from enrich_spatial import (
+    ParcelGridIndex,
+    resolve_points,
+)
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# City Hall, and two parcels roughly 10m and 100m north of it
+parcels = [
+    ("CITY_HALL", 39.95240, -75.16360),
+    ("NEAR", 39.95249, -75.16360),
+    ("FAR", 39.95330, -75.16360),
+]
+
+
+def test_nearest() -> None:
+    """
+    Test the ParcelGridIndex.nearest function, within and outside the distance threshold.
+    """
+    logger.debug("Running test_nearest...")
+
+    index = ParcelGridIndex(parcels, 30.0)
+
+    opa_account_num, distance = index.nearest(39.95241, -75.16360)
+    logger.debug(f"Nearest to City Hall: {opa_account_num} at {distance:.1f}m")
+    assert opa_account_num == "CITY_HALL"
+    assert distance < 2
+
+    opa_account_num, distance = index.nearest(39.95320, -75.16360)
+    assert opa_account_num == "FAR"
+
+    # Roughly 50m from FAR and NEAR, so outside the threshold
+    assert index.nearest(39.95290, -75.16360) is None
+
+    logger.debug("test_nearest passed")
+
+
+def test_resolve_points() -> None:
+    """
+    Test the resolve_points function. Only points with a parcel within the threshold are returned.
+    """
+    logger.debug("Running test_resolve_points...")
+
+    index = ParcelGridIndex(parcels, 30.0)
+    points = [
+        ("1 PENN SQ", 39.95250, -75.16360),
+        ("NOWHERE", 40.10000, -75.00000),
+    ]
+    matches = resolve_points(points, index)
+
+    assert len(matches) == 1
+    assert matches[0][0] == "1 PENN SQ"
+    assert matches[0][1] == "NEAR"
+
+    logger.debug("test_resolve_points passed")
+
+
+if __name__ == "__main__":
+    logger.info("Running enrich_spatial tests...")
+
+    test_nearest()
+    test_resolve_points()
+
+    logger.info("All enrich_spatial tests passed!")
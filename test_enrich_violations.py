@@ -0,0 +1,56 @@
+"""
+Test script for enrich_violations.py
+"""
+
+import logging
+import sqlite3
+import sys
+import pytest
+import download_311
+import download_violations
+import enrich_ais
+from enrich_violations import compute_violation_counts
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def test_compute_violation_counts_for_accounts(temp_database: str) -> None:
+    """
+    Test that compute_violation_counts with a list of OPA accounts only recomputes the tickets at
+    those accounts, and that an empty list recomputes nothing.
+    """
+    logger.debug("Running test_compute_violation_counts_for_accounts...")
+
+    download_311.save_data([
+        {'service_request_id': 'cv_1', 'status': 'Open', 'address': '1 TEST ST', 'requested_datetime': '2025-01-01'},
+        {'service_request_id': 'cv_2', 'status': 'Open', 'address': '2 TEST ST', 'requested_datetime': '2025-01-01'},
+    ])
+    enrich_ais.save_ais_data('1 TEST ST', 'OPA1')
+    enrich_ais.save_ais_data('2 TEST ST', 'OPA2')
+    compute_violation_counts()
+
+    download_violations.save_data([
+        {'cartodb_id': 1, 'opa_account_num': 'OPA1', 'casecreateddate': '2025-02-01'},
+        {'cartodb_id': 2, 'opa_account_num': 'OPA2', 'casecreateddate': '2025-02-01'},
+    ])
+
+    def counts() -> dict[str, int]:
+        with sqlite3.connect(temp_database) as conn:
+            return dict(conn.execute("SELECT service_request_id, violation_count FROM violation_counts").fetchall())
+
+    compute_violation_counts([])
+    assert counts() == {'cv_1': 0, 'cv_2': 0}, "An empty list should not recompute anything"
+
+    compute_violation_counts(['OPA1'])
+    assert counts() == {'cv_1': 1, 'cv_2': 0}, "Only OPA1's tickets should be recomputed"
+
+    compute_violation_counts()
+    assert counts() == {'cv_1': 1, 'cv_2': 1}
+
+    logger.debug("test_compute_violation_counts_for_accounts passed")
+
+
+if __name__ == "__main__":
+    # the tests take the temp_database fixture (conftest.py), so they run under pytest
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,121 @@
+"""
+Test script for fuzzy_match.py
+"""
+
+import logging
+from fuzzy_match import (
+    TrigramIndex,
+    normalize_address,
+    street_direction,
+    unit_designation,
+)
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def test_normalize_address() -> None:
+    """
+    Test the normalize_address function.
+    """
+    logger.debug("Running test_normalize_address...")
+
+    assert normalize_address("1400 John F. Kennedy Boulevard") == "1400 JOHN F KENNEDY BLVD"
+    assert normalize_address("  1234  north broad street, ") == "1234 N BROAD ST"
+    assert normalize_address("") == ""
+    assert normalize_address("2401 Pennsylvania Ave #1B") == "2401 PENNSYLVANIA AVE # 1B"
+
+    assert unit_designation("2401 PENNSYLVANIA AVE APT 1B") == "APT 1B"
+    assert unit_designation("2401 PENNSYLVANIA AVE # 1B") == "# 1B"
+    assert unit_designation("1234 MARKET ST") == ""
+
+    logger.debug("test_normalize_address passed")
+
+
+def test_lookup() -> None:
+    """
+    Test the TrigramIndex.lookup function, for exact, fuzzy, and rejected matches.
+    """
+    logger.debug("Running test_lookup...")
+
+    index = TrigramIndex(threshold=0.85)
+    index.add("1400 JOHN F KENNEDY BLVD", "883309050")
+    index.add("1234 MARKET ST", "111111111")
+
+    assert index.lookup("1400 John F. Kennedy Boulevard") == ("883309050", 1.0, "1400 JOHN F KENNEDY BLVD")
+
+    opa_account_num, score, matched_address = index.lookup("1400 JOHN F KENEDY BLVD")
+    logger.debug(f"Typo matched with score {score:.2f}")
+    assert opa_account_num == "883309050"
+    assert matched_address == "1400 JOHN F KENNEDY BLVD"
+    assert 0.85 <= score < 1.0
+
+    # A different house number is a different parcel, however similar the rest is
+    assert index.lookup("1243 MARKET ST") is None
+    assert index.lookup("9999 SOMEWHERE ELSE") is None
+
+    logger.debug("test_lookup passed")
+
+
+def test_lookup_rejects_other_units() -> None:
+    """
+    Test that addresses differing only in unit are not matched, since condo units have their own OPA accounts.
+    """
+    logger.debug("Running test_lookup_rejects_other_units...")
+
+    index = TrigramIndex(threshold=0.85)
+    index.add("2401 PENNSYLVANIA AVE APT 1A", "888000001")
+    index.add("2401 PENNSYLVANIA AVE", "888000000")
+
+    assert index.lookup("2401 PENNSYLVANIA AVE APT 1B") is None
+    assert index.lookup("2401 PENNSYLVANIA AVE APT 11A") is None
+    assert index.lookup("2401 PENNSYLVANIA AVE UNIT 1A") is None
+
+    # a typo in the street still matches, as long as the unit is the same
+    opa_account_num, _, _ = index.lookup("2401 PENSYLVANIA AVE APT 1A")
+    assert opa_account_num == "888000001"
+    opa_account_num, _, _ = index.lookup("2401 PENSYLVANIA AVE")
+    assert opa_account_num == "888000000"
+
+    logger.debug("test_lookup_rejects_other_units passed")
+
+
+def test_lookup_rejects_other_directions() -> None:
+    """
+    Test that addresses differing only in street direction are not matched, since they are on
+    opposite sides of the city.
+    """
+    logger.debug("Running test_lookup_rejects_other_directions...")
+
+    assert street_direction("1234 N PENNSYLVANIA AVE") == "N"
+    assert street_direction("1234 MARKET ST") == ""
+    assert street_direction("N BROAD ST") == "N"
+
+    index = TrigramIndex(threshold=0.85)
+    index.add("1234 S PENNSYLVANIA AVE", "777000001")
+    index.add("1234 W MOYAMENSING AVE", "777000002")
+    index.add("300 S COLUMBUS BLVD", "777000003")
+
+    assert index.lookup("1234 N PENNSYLVANIA AVE") is None
+    assert index.lookup("1234 NORTH PENNSYLVANIA AVENUE") is None
+    assert index.lookup("1234 E MOYAMENSING AVE") is None
+    assert index.lookup("300 N COLUMBUS BLVD") is None
+
+    # a typo in the street still matches, as long as the direction is the same
+    opa_account_num, _, _ = index.lookup("1234 S PENSYLVANIA AVE")
+    assert opa_account_num == "777000001"
+    opa_account_num, _, _ = index.lookup("1234 West Moyamensing Avenue")
+    assert opa_account_num == "777000002"
+
+    logger.debug("test_lookup_rejects_other_directions passed")
+
+
+if __name__ == "__main__":
+    logger.info("Running fuzzy_match tests...")
+
+    test_normalize_address()
+    test_lookup()
+    test_lookup_rejects_other_units()
+    test_lookup_rejects_other_directions()
+
+    logger.info("All fuzzy_match tests passed!")
@@ -0,0 +1,86 @@
+"""
+Test script for hedging.py
+"""
+
+import logging
+import threading
+import time
+from hedging import Hedger
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def test_no_hedge_before_min_samples() -> None:
+    """
+    Test that nothing is hedged until there are enough latency samples to compute a percentile.
+    """
+    logger.debug("Running test_no_hedge_before_min_samples...")
+
+    with Hedger(max_workers=4, budget=1.0, min_samples=5) as hedger:
+        assert hedger.hedge_delay() is None
+        for i in range(5):
+            assert hedger.call(lambda x: x * 2, i) == i * 2
+        assert hedger.metrics()["hedges"] == 0
+        assert hedger.hedge_delay() is not None
+
+    logger.debug("test_no_hedge_before_min_samples passed")
+
+
+def test_hedge_wins_slow_call() -> None:
+    """
+    Test that a call slower than the p95 latency is hedged, and the faster duplicate's result is used.
+    """
+    logger.debug("Running test_hedge_wins_slow_call...")
+
+    calls = []
+    lock = threading.Lock()
+
+    def lookup(address: str) -> str:
+        with lock:
+            calls.append(address)
+            first = len(calls) == 1
+        # only the first call of the slow address is slow; its duplicate is fast
+        if address == "slow" and first:
+            time.sleep(1.0)
+        return address.upper()
+
+    with Hedger(max_workers=4, budget=1.0, min_samples=5) as hedger:
+        for _ in range(5):
+            hedger.call(lambda address: address.upper(), "fast")
+
+        start = time.monotonic()
+        assert hedger.call(lookup, "slow") == "SLOW"
+        elapsed = time.monotonic() - start
+        metrics = hedger.metrics()
+
+    logger.debug(f"Hedged call took {elapsed:.3f}s, metrics: {metrics}")
+    assert elapsed < 0.5
+    assert metrics["hedges"] == 1
+    assert metrics["hedge_wins"] == 1
+
+    logger.debug("test_hedge_wins_slow_call passed")
+
+
+def test_hedge_budget() -> None:
+    """
+    Test that the hedge budget caps the number of duplicates sent.
+    """
+    logger.debug("Running test_hedge_budget...")
+
+    with Hedger(max_workers=4, budget=0.0, min_samples=1) as hedger:
+        hedger.call(lambda x: x, 1)
+        assert hedger.call(lambda x: time.sleep(0.05) or x, 2) == 2
+        assert hedger.metrics()["hedges"] == 0
+
+    logger.debug("test_hedge_budget passed")
+
+
+if __name__ == "__main__":
+    logger.info("Running hedging tests...")
+
+    test_no_hedge_before_min_samples()
+    test_hedge_wins_slow_call()
+    test_hedge_budget()
+
+    logger.info("All hedging tests passed!")
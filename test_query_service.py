@@ -0,0 +1,165 @@
+"""
+Test script for query_service.py
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import download_311
+import enrich_ais
+import enrich_violations
+import query_service
+from query_service import (
+    LRUCache,
+    QueryHandler,
+    QueryService,
+    summarize,
+)
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def test_lru_cache() -> None:
+    """
+    Test the LRUCache class: eviction of the least recently used entry, and clearing.
+    """
+    logger.debug("Running test_lru_cache...")
+
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    # "b" was least recently used, so it was evicted
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1}
+
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+    logger.debug("test_lru_cache passed")
+
+
+def test_summarize() -> None:
+    """
+    Test the summarize function.
+    """
+    logger.debug("Running test_summarize...")
+
+    tickets = [
+        {"status": "Open", "violation_count": 2},
+        {"status": "open", "violation_count": 0},
+        {"status": "Closed", "violation_count": 1},
+        {"status": None, "violation_count": 0},
+    ]
+    assert summarize(tickets) == {"total_tickets": 4, "tickets_with_violations": 2, "open_tickets": 2}
+    assert summarize([]) == {"total_tickets": 0, "tickets_with_violations": 0, "open_tickets": 0}
+
+    logger.debug("test_summarize passed")
+
+
+def test_query_service(temp_database: str) -> None:
+    """
+    Test QueryService.address and QueryService.opa against a small temporary database, and that
+    the cache is cleared when the pipeline run marker changes.
+    """
+    logger.debug("Running test_query_service...")
+
+    download_311.save_data([
+        {'service_request_id': 'qs_1', 'status': 'Open', 'address': '1 TEST ST', 'requested_datetime': '2025-01-01'},
+        {'service_request_id': 'qs_2', 'status': 'Closed', 'address': '1 TEST ST', 'requested_datetime': '2025-02-01'},
+        {'service_request_id': 'qs_3', 'status': 'Open', 'address': '1 TEST ST UNIT A', 'requested_datetime': '2025-03-01'},
+    ])
+    enrich_ais.save_ais_data('1 TEST ST', '123456789')
+    enrich_ais.save_ais_data('1 TEST ST UNIT A', '123456789')
+    with sqlite3.connect(temp_database) as conn:
+        conn.executemany(
+            "INSERT INTO violation_counts (service_request_id, opa_account_num, violation_count) VALUES (?, ?, ?)",
+            [('qs_1', '123456789', 2), ('qs_2', '123456789', 0), ('qs_3', '123456789', 1)]
+        )
+        conn.commit()
+
+    service = QueryService(temp_database, pool_size=2)
+    result = service.address('1 TEST ST')
+    assert result['opa_account_num'] == '123456789'
+    assert (result['total_tickets'], result['tickets_with_violations'], result['open_tickets']) == (2, 1, 1)
+    assert [ticket['service_request_id'] for ticket in result['tickets']] == ['qs_1', 'qs_2']
+
+    result = service.opa('123456789')
+    assert result['addresses'] == ['1 TEST ST', '1 TEST ST UNIT A']
+    assert (result['total_tickets'], result['tickets_with_violations'], result['open_tickets']) == (3, 2, 2)
+
+    assert service.address('NOWHERE')['total_tickets'] == 0
+
+    # a new violation is not seen until the pipeline signals the end of a run
+    with sqlite3.connect(temp_database) as conn:
+        conn.execute("UPDATE violation_counts SET violation_count = 1 WHERE service_request_id = 'qs_2'")
+        conn.commit()
+    assert service.address('1 TEST ST')['tickets_with_violations'] == 1
+    with open(query_service.run_marker_file, 'w') as f:
+        f.write('done')
+    assert service.address('1 TEST ST')['tickets_with_violations'] == 2
+    assert service.cache.stats()['size'] == 1
+
+    # a clean run replaces the database file, and the service reads the new one after the run
+    os.remove(temp_database)
+    download_311.init_database()
+    enrich_ais.init_ais_table()
+    enrich_violations.init_violations_table()
+    download_311.save_data([
+        {'service_request_id': 'qs_4', 'status': 'Open', 'address': '1 TEST ST', 'requested_datetime': '2025-04-01'},
+    ])
+    marker_mtime = os.stat(query_service.run_marker_file).st_mtime
+    os.utime(query_service.run_marker_file, (marker_mtime + 1, marker_mtime + 1))
+    result = service.address('1 TEST ST')
+    assert [ticket['service_request_id'] for ticket in result['tickets']] == ['qs_4']
+    assert result['opa_account_num'] is None
+
+    logger.debug("test_query_service passed")
+
+
+def test_query_handler_database_error(temp_database: str) -> None:
+    """
+    Test that a database error is answered with a JSON 500 rather than a dropped connection.
+    """
+    logger.debug("Running test_query_handler_database_error...")
+
+    with sqlite3.connect(temp_database) as conn:
+        conn.execute("DROP TABLE violation_counts")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QueryHandler)
+    server.service = QueryService(temp_database, pool_size=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/address?address=1%20TEST%20ST"
+        try:
+            urllib.request.urlopen(url, timeout=5)
+            assert False, "expected an HTTP error"
+        except urllib.error.HTTPError as e:
+            assert e.code == 500
+            assert "no such table" in json.loads(e.read())["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    logger.debug("test_query_handler_database_error passed")
+
+
+if __name__ == "__main__":
+    logger.info("Running query_service tests...")
+
+    test_lru_cache()
+    test_summarize()
+    # the tests that take the temp_database fixture (conftest.py) only run under pytest
+
+    logger.info("All query_service tests passed!")
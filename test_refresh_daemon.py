@@ -0,0 +1,127 @@
+"""
+Test script for refresh_daemon.py
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import timedelta
+import pytest
+import download_311
+import download_violations
+import enrich_ais
+import enrich_violations
+import generate_report
+import refresh_daemon
+from refresh_daemon import (
+    RefreshDaemon,
+    parse_timestamp,
+)
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def test_parse_timestamp() -> None:
+    """
+    Test the parse_timestamp function with the formats Carto returns.
+    """
+    logger.debug("Running test_parse_timestamp...")
+
+    assert parse_timestamp("2025-12-30T14:05:00Z").strftime("%Y-%m-%dT%H:%M:%S") == "2025-12-30T14:05:00"
+    assert parse_timestamp("2025-12-30T14:05:00.123Z").microsecond == 123000
+    assert parse_timestamp("2025-12-30").day == 30
+
+    logger.debug("test_parse_timestamp passed")
+
+
+def test_watermark(temp_database: str) -> None:
+    """
+    Test the watermark function: the newest local row less the overlap, or the start of 2025 for an empty table.
+    """
+    logger.debug("Running test_watermark...")
+
+    daemon = RefreshDaemon(overlap=timedelta(days=1))
+    try:
+        assert daemon.watermark("public_cases_fc", "requested_datetime") == "2025-01-01"
+        download_311.save_data([
+            {'service_request_id': 'wm_1', 'status': 'Open', 'address': '1 TEST ST', 'requested_datetime': '2025-06-01T08:00:00Z'},
+            {'service_request_id': 'wm_2', 'status': 'Open', 'address': '1 TEST ST', 'requested_datetime': '2025-12-30T14:05:00Z'},
+        ])
+        assert daemon.watermark("public_cases_fc", "requested_datetime") == "2025-12-29T14:05:00"
+    finally:
+        daemon.close()
+
+    logger.debug("test_watermark passed")
+
+
+def test_refresh_new_account_after_demand_mode(temp_database: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test a refresh after a demand-mode run, where the violations watermark is months after the 311
+    watermark. A new ticket at an address resolved to a new OPA account should still be matched to
+    the violations filed between the ticket and the violations watermark.
+    """
+    logger.debug("Running test_refresh_new_account_after_demand_mode...")
+
+    calls = []
+
+    def get_311_service_requests(limit, offset, start_date, end_date, session=None):
+        calls.append(("311", start_date))
+        return [
+            {'service_request_id': 'rd_2', 'status': 'Open', 'address': '2 ELM ST', 'requested_datetime': '2026-03-01T09:00:00Z'},
+        ]
+
+    def get_violations(limit, offset, start_date, end_date=None, session=None):
+        calls.append(("violations", start_date))
+        return []
+
+    def get_violations_for_opa(opa_account_nums, since, session, limit=10000):
+        calls.append(("violations_for_opa", tuple(opa_account_nums), since))
+        return [{'cartodb_id': 20, 'opa_account_num': 'OPA2', 'casecreateddate': '2026-04-01T00:00:00Z'}]
+
+    def fetch_ais(address, session):
+        return {"features": [{"properties": {"opa_account_num": "OPA2"}}]}
+
+    monkeypatch.setattr(download_311, "get_311_service_requests", get_311_service_requests)
+    monkeypatch.setattr(download_violations, "get_violations", get_violations)
+    monkeypatch.setattr(download_violations, "get_violations_for_opa", get_violations_for_opa)
+    monkeypatch.setattr(enrich_ais, "fetch_ais", fetch_ais)
+
+    download_311.save_data([
+        {'service_request_id': 'rd_1', 'status': 'Open', 'address': '1 MAIN ST', 'requested_datetime': '2025-12-30T10:00:00Z'},
+    ])
+    enrich_ais.save_ais_data('1 MAIN ST', 'OPA1')
+    download_violations.save_data([
+        {'cartodb_id': 10, 'opa_account_num': 'OPA1', 'casecreateddate': '2026-10-10T00:00:00Z'},
+    ])
+    enrich_violations.compute_violation_counts()
+
+    daemon = RefreshDaemon()
+    try:
+        daemon.refresh()
+    finally:
+        daemon.close()
+
+    logger.debug(f"Calls: {calls}")
+    assert ("311", "2025-12-29T10:00:00") in calls
+    assert ("violations", "2026-10-09T00:00:00") in calls
+    assert ("violations_for_opa", ("OPA2",), "2026-03-01") in calls
+
+    with sqlite3.connect(temp_database) as conn:
+        counts = dict(conn.execute("SELECT service_request_id, violation_count FROM violation_counts").fetchall())
+    assert counts == {'rd_1': 1, 'rd_2': 1}, f"Both tickets should be matched: {counts}"
+    assert os.path.exists(refresh_daemon.run_marker_file)
+    report = open(generate_report.report_file).read()
+    assert "Total Service Requests: 2" in report
+    assert "Period: 2025-12-30 to 2026-03-01" in report
+
+    logger.debug("test_refresh_new_account_after_demand_mode passed")
+
+
+if __name__ == "__main__":
+    logger.info("Running refresh_daemon tests...")
+
+    test_parse_timestamp()
+    # the tests that take the temp_database fixture (conftest.py) only run under pytest
+
+    logger.info("All refresh_daemon tests passed!")
@@ -0,0 +1,63 @@
+"""
+Test script for verify_partitions.py
+"""
+
+import hashlib
+import logging
+from verify_partitions import (
+    diff_partitions,
+    key_digest,
+    next_month,
+)
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def test_key_digest() -> None:
+    """
+    Test the key_digest function matches the first 32 bits of the md5, as Carto computes it.
+    """
+    logger.debug("Running test_key_digest...")
+
+    assert key_digest("12345|Open") == int(hashlib.md5(b"12345|Open").hexdigest()[:8], 16)
+    assert 0 <= key_digest("") < 2 ** 32
+
+    logger.debug("test_key_digest passed")
+
+
+def test_diff_partitions() -> None:
+    """
+    Test the diff_partitions function, for differing counts, digests, and missing partitions.
+    """
+    logger.debug("Running test_diff_partitions...")
+
+    remote = {"2025-01": (10, 100), "2025-02": (5, 50), "2025-03": (3, 30), "2025-04": (1, 1)}
+    local = {"2025-01": (10, 100), "2025-02": (4, 45), "2025-03": (3, 31), "2025-05": (1, 1)}
+    assert diff_partitions(remote, local) == ["2025-02", "2025-03", "2025-04", "2025-05"]
+    assert diff_partitions(remote, remote) == []
+
+    logger.debug("test_diff_partitions passed")
+
+
+def test_next_month() -> None:
+    """
+    Test the next_month function, including the year boundary.
+    """
+    logger.debug("Running test_next_month...")
+
+    assert next_month("2025-01") == "2025-02-01"
+    assert next_month("2025-09") == "2025-10-01"
+    assert next_month("2025-12") == "2026-01-01"
+
+    logger.debug("test_next_month passed")
+
+
+if __name__ == "__main__":
+    logger.info("Running verify_partitions tests...")
+
+    test_key_digest()
+    test_diff_partitions()
+    test_next_month()
+
+    logger.info("All verify_partitions tests passed!")
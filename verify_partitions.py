@@ -0,0 +1,244 @@
+"""
+Script to verify the local public_cases_fc and violations tables against Carto without redownloading them.
+
+Row counts and an order-independent digest (the sum of the first 32 bits of the md5 of each row's key)
+are computed per month, server-side in Carto and locally in SQLite. Months that differ are drilled
+down to days, and only the days that differ are deleted and redownloaded.
+
+The violations check covers the full-mode download window; after a demand-mode download the local
+violations table holds a different set of rows by design, so it is only checked with `--violations`.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import requests
+
+import download_311
+import download_violations
+
+sqlite_db = "data/311_service_requests.db"
+carto_url = "https://phl.carto.com/api/v2/sql"
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The key of each row covers the columns a redownload would change, so status updates are caught too
+datasets = {
+    "public_cases_fc": {
+        "date_column": "requested_datetime",
+        "carto_key": "service_request_id::text || '|' || coalesce(status, '')",
+        "local_key": "service_request_id || '|' || coalesce(status, '')",
+        "carto_filter": "agency_responsible = 'License ' || chr(38) || ' Inspections'",
+        "start_date": "2025-01-01",
+        # daemon mode keeps downloading past 2025, so check up to today
+        "end_date": None,
+        "download": download_311.get_311_service_requests,
+        "save": download_311.save_data,
+    },
+    "violations": {
+        "date_column": "casecreateddate",
+        "carto_key": "cartodb_id::text || '|' || coalesce(opa_account_num, '')",
+        "local_key": "CAST(cartodb_id AS TEXT) || '|' || coalesce(opa_account_num, '')",
+        "carto_filter": "TRUE",
+        "start_date": download_violations.full_start_date,
+        # the full-mode download has no upper bound, so check up to today
+        "end_date": None,
+        "download": download_violations.get_violations,
+        "save": download_violations.save_data,
+    },
+}
+
+
+def key_digest(key: str) -> int:
+    """
+    Digest a single row key, matching the Carto-side expression in get_carto_digests.
+
+    Args:
+        key: the row key
+
+    Returns:
+        the first 32 bits of the md5 of the key, as an unsigned integer
+    """
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def get_carto_digests(dataset: str, part_length: int, start_date: str, end_date: str) -> dict[str, tuple[int, int]]:
+    """
+    Get the row count and digest of each partition of a dataset in Carto.
+
+    Args:
+        dataset: the dataset name, a key of `datasets`
+        part_length: 7 to partition by month (YYYY-MM), 10 to partition by day (YYYY-MM-DD)
+        start_date: the earliest date to include, as YYYY-MM-DD
+        end_date: the exclusive upper date bound, as YYYY-MM-DD
+
+    Returns:
+        a dictionary of partitions to (row_count, digest)
+    """
+    config = datasets[dataset]
+    date_format = "YYYY-MM" if part_length == 7 else "YYYY-MM-DD"
+    query = f"""SELECT 
+        to_char({config['date_column']}, '{date_format}') AS part,
+        COUNT(*) AS row_count,
+        SUM(('x' || '00000000' || substr(md5({config['carto_key']}), 1, 8))::bit(64)::bigint) AS digest
+        FROM {dataset}
+        WHERE {config['date_column']} >= '{start_date}'
+        AND {config['date_column']} < '{end_date}'
+        AND {config['carto_filter']}
+        GROUP BY 1
+    """
+    logger.debug(f"Query: {query}")
+    response = requests.get(carto_url, params={"q": query}, timeout=60)
+    response.raise_for_status()
+    return {row['part']: (int(row['row_count']), int(row['digest'])) for row in response.json()['rows']}
+
+
+def get_local_digests(dataset: str, part_length: int, start_date: str, end_date: str) -> dict[str, tuple[int, int]]:
+    """
+    Get the row count and digest of each partition of a local table.
+
+    Args:
+        dataset: the dataset name, a key of `datasets`
+        part_length: 7 to partition by month (YYYY-MM), 10 to partition by day (YYYY-MM-DD)
+        start_date: the earliest date to include, as YYYY-MM-DD
+        end_date: the exclusive upper date bound, as YYYY-MM-DD
+
+    Returns:
+        a dictionary of partitions to (row_count, digest)
+    """
+    config = datasets[dataset]
+    digests = {}
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT substr({config['date_column']}, 1, ?), {config['local_key']}
+            FROM {dataset}
+            WHERE {config['date_column']} >= ? AND {config['date_column']} < ?
+        """, (part_length, start_date, end_date))
+        for part, key in cursor.fetchall():
+            row_count, digest = digests.get(part, (0, 0))
+            digests[part] = (row_count + 1, digest + key_digest(key))
+    return digests
+
+
+def diff_partitions(remote: dict[str, tuple[int, int]], local: dict[str, tuple[int, int]]) -> list[str]:
+    """
+    Get the partitions whose row count or digest differ, including partitions missing on either side.
+
+    Args:
+        remote: the Carto partition digests
+        local: the local partition digests
+
+    Returns:
+        the differing partitions, sorted
+    """
+    return sorted(part for part in remote.keys() | local.keys() if remote.get(part) != local.get(part))
+
+
+def next_month(month: str) -> str:
+    """
+    Get the first day of the month after a YYYY-MM month.
+
+    Args:
+        month: the month, as YYYY-MM
+
+    Returns:
+        the first day of the next month, as YYYY-MM-DD
+    """
+    year, month_number = int(month[:4]), int(month[5:7])
+    if month_number == 12:
+        return f"{year + 1}-01-01"
+    return f"{year}-{month_number + 1:02d}-01"
+
+
+def find_differing_days(dataset: str) -> list[str]:
+    """
+    Compare a dataset with Carto by month, then by day within the months that differ.
+
+    Args:
+        dataset: the dataset name, a key of `datasets`
+
+    Returns:
+        the days that differ, as YYYY-MM-DD, sorted
+    """
+    config = datasets[dataset]
+    start_date = config['start_date']
+    end_date = config['end_date'] or (date.today() + timedelta(days=1)).isoformat()
+    months = diff_partitions(
+        get_carto_digests(dataset, 7, start_date, end_date),
+        get_local_digests(dataset, 7, start_date, end_date),
+    )
+    logger.info(f"{dataset}: {len(months)} months differ from Carto")
+
+    days = []
+    for month in months:
+        month_start, month_end = f"{month}-01", next_month(month)
+        days.extend(diff_partitions(
+            get_carto_digests(dataset, 10, month_start, month_end),
+            get_local_digests(dataset, 10, month_start, month_end),
+        ))
+    logger.info(f"{dataset}: {len(days)} days differ from Carto")
+    return days
+
+
+def redownload_day(dataset: str, day: str, limit: int = 10000) -> int:
+    """
+    Replace a day of a local table with a fresh download from Carto.
+
+    Args:
+        dataset: the dataset name, a key of `datasets`
+        day: the day, as YYYY-MM-DD
+        limit: the number of records to download in each batch
+
+    Returns:
+        the number of rows downloaded
+    """
+    config = datasets[dataset]
+    day_end = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    rows = []
+    offset = 0
+    while True:
+        data = config['download'](limit, offset, day, day_end)
+        rows.extend(data)
+        if len(data) < limit:
+            break
+        offset += limit
+
+    with sqlite3.connect(sqlite_db) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"DELETE FROM {dataset} WHERE {config['date_column']} >= ? AND {config['date_column']} < ?",
+            (day, day_end)
+        )
+        conn.commit()
+    config['save'](rows)
+    return len(rows)
+
+
+def main(check_violations: bool = False, repair: bool = True) -> None:
+    """
+    Main function to verify the local tables against Carto, and redownload the days that differ.
+
+    Args:
+        check_violations: whether to check the violations table as well as public_cases_fc
+        repair: whether to redownload the days that differ, or only report them
+    """
+    names = ["public_cases_fc", "violations"] if check_violations else ["public_cases_fc"]
+    for dataset in names:
+        days = find_differing_days(dataset)
+        if not repair:
+            for day in days:
+                logger.info(f"{dataset}: {day} differs from Carto")
+            continue
+        for day in days:
+            count = redownload_day(dataset, day)
+            logger.info(f"{dataset}: redownloaded {count} rows for {day}")
+
+    logger.info("Verification complete.")
+
+
+if __name__ == "__main__":
+    main(check_violations='--violations' in sys.argv, repair='--dry-run' not in sys.argv)